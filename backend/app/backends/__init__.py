@@ -0,0 +1,46 @@
+import os
+from .base import ModelBackend
+from .stub import StubBackend
+
+
+def create_backend(name: str = None) -> ModelBackend:
+    """Create the model backend selected by MODEL_BACKEND (llama, http or stub)"""
+    name = (name or os.getenv("MODEL_BACKEND", "llama")).lower()
+    if name == "stub":
+        return StubBackend(
+            first_token_latency=float(os.getenv("STUB_FIRST_TOKEN_LATENCY", "0")),
+            token_latency=float(os.getenv("STUB_TOKEN_LATENCY", "0"))
+        )
+    if name == "http":
+        from .openai_http import OpenAIHTTPBackend
+        return OpenAIHTTPBackend(
+            base_url=os.getenv("MODEL_SERVER_URL", "http://localhost:8080/v1"),
+            model=os.getenv("MODEL_NAME", "default"),
+            api_key=os.getenv("MODEL_SERVER_API_KEY"),
+            pool_size=int(os.getenv("MODEL_SERVER_POOL_SIZE", "8")),
+            timeout=float(os.getenv("MODEL_SERVER_TIMEOUT", "300")),
+            ready_ttl=float(os.getenv("MODEL_SERVER_READY_TTL", "30"))
+        )
+    if name == "llama":
+        from .llama_local import LlamaCppBackend
+        from ..model_artifacts import ModelArtifactManager
+        cache_dir = os.getenv("MODEL_CACHE_DIR", "./models")
+        return LlamaCppBackend(
+            model_path=os.getenv("MODEL_PATH"),
+            cache_dir=cache_dir,
+            n_ctx=int(os.getenv("MODEL_N_CTX", "2048")),
+            n_threads=int(os.getenv("MODEL_N_THREADS", "4")),
+            model_url=os.getenv("MODEL_URL"),
+            sha256=os.getenv("MODEL_SHA256"),
+            artifacts=ModelArtifactManager(
+                cache_dir=cache_dir,
+                mirror=os.getenv("MODEL_MIRROR"),
+                workers=int(os.getenv("MODEL_DOWNLOAD_WORKERS", "8")),
+                chunk_size=int(os.getenv("MODEL_DOWNLOAD_CHUNK_MB", "32")) * 1024 * 1024,
+                token=os.getenv("HF_TOKEN")
+            )
+        )
+    raise ValueError(f"Unknown model backend: {name}")
+
+
+__all__ = ["ModelBackend", "StubBackend", "create_backend"]
@@ -0,0 +1,53 @@
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+def estimate_tokens(text: str) -> List[int]:
+    """Placeholder token ids for backends without a tokenizer, at roughly four bytes per token"""
+    return list(range(max(1, len(text.encode("utf-8")) // 4)))
+
+
+class ModelBackend:
+    """Common interface for the text generation runtimes used by NLPService"""
+
+    name = "base"
+
+    def is_ready(self) -> bool:
+        """Whether the backend can serve generations"""
+        raise NotImplementedError
+
+    def tokenize(self, text: str) -> List[int]:
+        raise NotImplementedError
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.tokenize(text))
+
+    def prefill(self, prompt_prefix: str) -> Optional[Any]:
+        """Evaluate a shared prompt prefix and return reusable model state, if the runtime supports it"""
+        return None
+
+    def state_size(self, kv_state: Optional[Any]) -> int:
+        """Approximate bytes held by a value returned from ``prefill``"""
+        return 0
+
+    def stream(self, prompt: str, max_tokens: int = 256, temperature: float = 0.1,
+               stop: Optional[List[str]] = None, kv_state: Optional[Any] = None,
+               should_stop: Optional[Callable[[], bool]] = None) -> Iterator[str]:
+        """Yield generated text one token (or chunk) at a time.
+
+        ``kv_state`` is a value returned by ``prefill`` for a prefix of ``prompt``.
+        ``should_stop`` is polled during decoding; generation ends early once it returns True.
+        """
+        raise NotImplementedError
+
+    def get_timings(self) -> Optional[Dict[str, float]]:
+        """Runtime-reported timings of the last generation on the calling thread, if the runtime exposes them"""
+        return None
+
+    def generate(self, prompt: str, max_tokens: int = 256, temperature: float = 0.1,
+                 stop: Optional[List[str]] = None, kv_state: Optional[Any] = None) -> str:
+        return "".join(self.stream(prompt, max_tokens=max_tokens, temperature=temperature, stop=stop, kv_state=kv_state))
+
+    def generate_batch(self, prompts: List[str], max_tokens: int = 256, temperature: float = 0.1,
+                       stop: Optional[List[str]] = None) -> List[str]:
+        """Generate completions for several prompts; runtimes with native batching override this"""
+        return [self.generate(p, max_tokens=max_tokens, temperature=temperature, stop=stop) for p in prompts]
@@ -0,0 +1,148 @@
+import os
+import sys
+import threading
+import logging
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from .base import ModelBackend
+from ..model_artifacts import ModelArtifactManager
+
+logger = logging.getLogger(__name__)
+
+class LlamaCppBackend(ModelBackend):
+    """In-process llama.cpp runtime loaded from a local or downloaded GGUF file"""
+
+    name = "llama"
+
+    def __init__(self, model_path: Optional[str] = None, repo_id: str = "mradermacher/natural-sql-7b-i1-GGUF",
+                 filename: str = "natural-sql-7b.i1-Q4_K_M.gguf", cache_dir: str = "./models",
+                 n_ctx: int = 2048, n_threads: int = 4, model_url: Optional[str] = None,
+                 sha256: Optional[str] = None, artifacts: Optional[ModelArtifactManager] = None):
+        self.model = None
+        self.model_path = model_path
+        self.repo_id = repo_id
+        self.filename = filename
+        self.cache_dir = cache_dir
+        self.model_url = model_url or f"https://huggingface.co/{repo_id}/resolve/main/{filename}"
+        self.sha256 = sha256
+        self.artifacts = artifacts or ModelArtifactManager(cache_dir)
+        self.n_ctx = n_ctx
+        self.n_threads = n_threads
+        # llama.cpp contexts are not thread-safe and hold a single KV cache
+        self.lock = threading.Lock()
+        self.last_timings = threading.local()
+        self._load_model()
+
+    def _load_model(self):
+        try:
+            # Imported lazily so other backends work without llama.cpp installed
+            from llama_cpp import Llama
+            
+            logger.info("🚀 Initializing llama.cpp backend...")
+            
+            model_path = self.model_path or self._download_model()
+            logger.info("🔄 Loading model into memory...")
+            sys.stdout.flush()
+            
+            # Load model on CPU
+            logger.info("💻 Loading model on CPU...")
+            self.model = Llama(
+                model_path=model_path,
+                n_ctx=self.n_ctx,
+                n_threads=self.n_threads,
+                verbose=False
+            )
+            logger.info("💻 Model loaded on CPU")
+            
+            logger.info("🎉 Model loaded successfully!")
+            logger.info("✨ Ready to convert natural language to SQL queries")
+            sys.stdout.flush()
+            
+        except Exception as e:
+            logger.error(f"❌ Failed to load model: {e}")
+            logger.error("🚫 Model loading failed")
+            sys.stdout.flush()
+            self.model = None
+
+    def _download_model(self) -> str:
+        logger.info(f"📥 Model: {self.repo_id}")
+        logger.info(f"📄 File: {self.filename}")
+        
+        # Files fetched by earlier versions through the Hugging Face cache layout are reused
+        snapshots = os.path.join(self.cache_dir, f"models--{self.repo_id.replace('/', '--')}", "snapshots")
+        existing = []
+        if os.path.isdir(snapshots):
+            existing = [os.path.join(snapshots, d, self.filename) for d in sorted(os.listdir(snapshots))]
+        
+        return self.artifacts.fetch(self.filename, self.model_url, sha256=self.sha256, existing=existing)
+
+    def is_ready(self) -> bool:
+        return self.model is not None
+
+    def tokenize(self, text: str) -> List[int]:
+        return self.model.tokenize(text.encode("utf-8"))
+
+    def prefill(self, prompt_prefix: str) -> Optional[Any]:
+        with self.lock:
+            self.model.reset()
+            self.model.eval(self.tokenize(prompt_prefix))
+            return self.model.save_state()
+
+    def state_size(self, kv_state: Optional[Any]) -> int:
+        if kv_state is None:
+            return 0
+        # The saved state copies the full n_ctx x n_vocab logits buffer next to the KV cells,
+        # a few hundred MB for a 7B model regardless of how long the prefix is
+        size = getattr(kv_state, "llama_state_size", 0)
+        for array in (getattr(kv_state, "scores", None), getattr(kv_state, "input_ids", None)):
+            size += getattr(array, "nbytes", 0)
+        return size
+
+    def stream(self, prompt: str, max_tokens: int = 256, temperature: float = 0.1,
+               stop: Optional[List[str]] = None, kv_state: Optional[Any] = None,
+               should_stop: Optional[Callable[[], bool]] = None) -> Iterator[str]:
+        with self.lock:
+            if kv_state is not None:
+                # llama.cpp skips re-evaluating the longest prefix already held in the KV cache
+                self.model.load_state(kv_state)
+            stopping_criteria = None
+            if should_stop is not None:
+                from llama_cpp import StoppingCriteriaList
+                # Checked by llama.cpp after every sampled token, so cancellation stops decoding immediately
+                stopping_criteria = StoppingCriteriaList([lambda input_ids, logits: should_stop()])
+            self._reset_timings()
+            try:
+                for chunk in self.model(prompt, max_tokens=max_tokens, temperature=temperature,
+                                        stop=stop or [], echo=False, stream=True,
+                                        stopping_criteria=stopping_criteria):
+                    yield chunk['choices'][0]['text']
+            finally:
+                self.last_timings.value = self._read_timings()
+
+    def _context(self):
+        # The raw llama_context moved behind a wrapper object in newer llama-cpp-python releases
+        wrapper = getattr(self.model, "_ctx", None)
+        return getattr(wrapper, "ctx", None) or getattr(self.model, "ctx", None)
+
+    def _reset_timings(self):
+        try:
+            import llama_cpp
+            llama_cpp.llama_reset_timings(self._context())
+        except Exception:
+            pass
+
+    def _read_timings(self) -> Optional[Dict[str, float]]:
+        try:
+            import llama_cpp
+            timings = llama_cpp.llama_get_timings(self._context())
+            return {
+                "prompt_eval_ms": round(timings.t_p_eval_ms, 2),
+                "prompt_eval_tokens": timings.n_p_eval,
+                "eval_ms": round(timings.t_eval_ms, 2),
+                "eval_tokens": timings.n_eval,
+                "sample_ms": round(timings.t_sample_ms, 2),
+            }
+        except Exception:
+            return None
+
+    def get_timings(self) -> Optional[Dict[str, float]]:
+        return getattr(self.last_timings, "value", None)
@@ -0,0 +1,152 @@
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .base import ModelBackend, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class OpenAIHTTPBackend(ModelBackend):
+    """Remote backend for a llama.cpp server or any OpenAI-compatible completions endpoint.
+
+    Requests share a pooled keep-alive session. Batches are sent as a single
+    multi-prompt request and fall back to concurrent requests over the pool
+    when the server does not accept prompt arrays. Readiness is probed at most
+    once per ``ready_ttl`` seconds; completions refresh it as they succeed or fail.
+    """
+
+    name = "http"
+
+    def __init__(self, base_url: str, model: str = "default", api_key: Optional[str] = None,
+                 pool_size: int = 8, timeout: float = 300.0, ready_ttl: float = 30.0):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=[502, 503, 504], allowed_methods=None)
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if api_key:
+            self.session.headers["Authorization"] = f"Bearer {api_key}"
+        self._native_batching = True
+        self._native_tokenize = True
+        self.last_timings = threading.local()
+        self.ready_ttl = ready_ttl
+        # (ready, monotonic time the answer expires)
+        self._ready = (False, 0.0)
+
+    @property
+    def server_root(self) -> str:
+        # llama.cpp exposes /tokenize and /health next to the /v1 OpenAI routes
+        return self.base_url[:-3] if self.base_url.endswith("/v1") else self.base_url
+
+    def is_ready(self) -> bool:
+        ready, expires = self._ready
+        if time.monotonic() < expires:
+            return ready
+        try:
+            response = self.session.get(f"{self.base_url}/models", timeout=5)
+            ready = response.status_code == 200
+        except requests.RequestException:
+            ready = False
+        self._ready = (ready, time.monotonic() + self.ready_ttl)
+        return ready
+
+    def _record_outcome(self, ok: bool):
+        # A served completion proves the server is up; a failed one makes the next is_ready probe again
+        self._ready = (True, time.monotonic() + self.ready_ttl) if ok else (False, 0.0)
+
+    def _post_completions(self, payload: dict, stream: bool = False) -> requests.Response:
+        try:
+            response = self.session.post(f"{self.base_url}/completions", json=payload, timeout=self.timeout, stream=stream)
+        except requests.RequestException:
+            self._record_outcome(False)
+            raise
+        self._record_outcome(response.status_code < 500)
+        return response
+
+    def tokenize(self, text: str) -> List[int]:
+        if self._native_tokenize:
+            try:
+                response = self.session.post(f"{self.server_root}/tokenize", json={"content": text}, timeout=self.timeout)
+                if response.status_code == 200:
+                    return response.json()["tokens"]
+            except (requests.RequestException, KeyError, ValueError):
+                pass
+            logger.info("Server has no /tokenize endpoint, estimating token counts")
+            self._native_tokenize = False
+        return estimate_tokens(text)
+
+    def _payload(self, prompt, max_tokens: int, temperature: float, stop: Optional[List[str]], stream: bool) -> dict:
+        return {
+            "model": self.model,
+            "prompt": prompt,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "stop": stop or [],
+            "stream": stream,
+        }
+
+    def stream(self, prompt: str, max_tokens: int = 256, temperature: float = 0.1,
+               stop: Optional[List[str]] = None, kv_state: Optional[Any] = None,
+               should_stop: Optional[Callable[[], bool]] = None) -> Iterator[str]:
+        self.last_timings.value = None
+        with self._post_completions(self._payload(prompt, max_tokens, temperature, stop, stream=True),
+                                    stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if should_stop and should_stop():
+                    # Closing the stream makes the server abort the generation
+                    break
+                if not line or not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                chunk = json.loads(data)
+                if chunk.get("timings"):
+                    # llama.cpp server reports prompt vs. decode timings on the final chunk
+                    self.last_timings.value = chunk["timings"]
+                text = chunk["choices"][0].get("text", "")
+                if text:
+                    yield text
+
+    def get_timings(self) -> Optional[Dict[str, float]]:
+        return getattr(self.last_timings, "value", None)
+
+    def generate(self, prompt: str, max_tokens: int = 256, temperature: float = 0.1,
+                 stop: Optional[List[str]] = None, kv_state: Optional[Any] = None) -> str:
+        response = self._post_completions(self._payload(prompt, max_tokens, temperature, stop, stream=False))
+        response.raise_for_status()
+        return response.json()["choices"][0]["text"]
+
+    def generate_batch(self, prompts: List[str], max_tokens: int = 256, temperature: float = 0.1,
+                       stop: Optional[List[str]] = None) -> List[str]:
+        if self._native_batching and len(prompts) > 1:
+            try:
+                response = self._post_completions(self._payload(prompts, max_tokens, temperature, stop, stream=False))
+                response.raise_for_status()
+                choices = response.json()["choices"]
+                if len(choices) == len(prompts):
+                    return [c["text"] for c in sorted(choices, key=lambda c: c.get("index", 0))]
+            except (requests.HTTPError, KeyError, ValueError):
+                pass
+            logger.info("Server does not batch prompt arrays, falling back to concurrent requests")
+            self._native_batching = False
+
+        with ThreadPoolExecutor(max_workers=min(self.pool_size, len(prompts)) or 1) as executor:
+            return list(executor.map(
+                lambda p: self.generate(p, max_tokens=max_tokens, temperature=temperature, stop=stop),
+                prompts
+            ))
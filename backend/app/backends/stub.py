@@ -0,0 +1,101 @@
+import re
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from .base import ModelBackend, estimate_tokens
+
+_NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "ten": 10, "twenty": 20}
+
+
+class StubBackend(ModelBackend):
+    """Deterministic rule-based backend for load tests and CI.
+
+    Reads the CREATE TABLE statements out of the prompt and maps a handful of
+    question patterns (counts, top-N, aggregates, quoted filters, recency) to
+    SQL. The same prompt always yields the same SQL, with configurable latency
+    to mimic a real model.
+    """
+
+    name = "stub"
+
+    def __init__(self, first_token_latency: float = 0.0, token_latency: float = 0.0):
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+
+    def is_ready(self) -> bool:
+        return True
+
+    def tokenize(self, text: str) -> List[int]:
+        return estimate_tokens(text)
+
+    def _parse_schema(self, prompt: str) -> Dict[str, List[str]]:
+        tables = {}
+        for name, body in re.findall(r"CREATE TABLE (\w+) \(\s*(.*?)\s*\);", prompt, re.S):
+            tables[name] = [col.strip().split()[0] for col in body.split(",") if col.strip()]
+        return tables
+
+    def _find_column(self, columns: List[str], words: List[str]) -> Optional[str]:
+        for word in words:
+            for column in columns:
+                if column.lower() == word or column.lower().rstrip("s") == word.rstrip("s"):
+                    return column
+        return None
+
+    def build_sql(self, prompt: str) -> str:
+        tables = self._parse_schema(prompt)
+        request = prompt.split("### Request", 1)[-1].split("###", 1)[0].strip()
+        lowered = request.lower()
+        words = re.findall(r"[a-z_]+", lowered)
+        if not tables:
+            return "SELECT 1"
+
+        table = next(
+            (t for t in tables if t.lower() in lowered or t.lower().rstrip("s") in words),
+            next(iter(tables))
+        )
+        columns = tables[table]
+
+        limit = None
+        match = re.search(r"\b(?:top|first|last|latest|limit)\s+(\d+|\w+)", lowered) or re.search(r"\b(\d+)\s+(?:most|rows|records)", lowered)
+        if match:
+            value = match.group(1)
+            limit = int(value) if value.isdigit() else _NUMBER_WORDS.get(value)
+
+        select = "*"
+        aggregate = re.search(r"\b(average|avg|total|sum|max|maximum|min|minimum)\s+(?:of\s+)?(\w+)", lowered)
+        if re.search(r"\b(how many|count|number of)\b", lowered):
+            select = "COUNT(*)"
+        elif aggregate:
+            column = self._find_column(columns, [aggregate.group(2)])
+            if column:
+                func = {"average": "AVG", "avg": "AVG", "total": "SUM", "sum": "SUM",
+                        "max": "MAX", "maximum": "MAX", "min": "MIN", "minimum": "MIN"}[aggregate.group(1)]
+                select = f"{func}({column})"
+
+        where = []
+        for quoted in re.findall(r"['\"]([^'\"]+)['\"]", request):
+            column = self._find_column(columns, words) or "status"
+            if column in columns:
+                where.append(f"{column} = '{quoted}'")
+        sql = f"SELECT {select} FROM {table}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+
+        if re.search(r"\b(recent|latest|newest|last)\b", lowered) and select == "*":
+            date_column = next((c for c in columns if "date" in c.lower() or c.lower().endswith("_at")), None)
+            if date_column:
+                sql += f" ORDER BY {date_column} DESC"
+        if limit and select == "*":
+            sql += f" LIMIT {limit}"
+        return sql + ";"
+
+    def stream(self, prompt: str, max_tokens: int = 256, temperature: float = 0.1,
+               stop: Optional[List[str]] = None, kv_state: Optional[Any] = None,
+               should_stop: Optional[Callable[[], bool]] = None) -> Iterator[str]:
+        tokens = re.findall(r"\S+\s*", self.build_sql(prompt))[:max_tokens]
+        time.sleep(self.first_token_latency)
+        for i, token in enumerate(tokens):
+            if should_stop and should_stop():
+                return
+            if i and self.token_latency:
+                time.sleep(self.token_latency)
+            yield token
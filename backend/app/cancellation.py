@@ -0,0 +1,69 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCancelled(Exception):
+    """Raised inside the query pipeline once its job is cancelled or past its deadline"""
+
+
+class CancelToken:
+    """Cooperative cancellation signal shared by a job's worker, model stream and database call.
+
+    Generation polls ``is_cancelled`` between tokens; blocking calls that cannot
+    poll (a running SQL statement) register an ``on_cancel`` callback that
+    interrupts them from the cancelling thread.
+    """
+
+    def __init__(self, deadline: Optional[float] = None):
+        self.deadline = deadline
+        self.reason: Optional[str] = None
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+        self.callbacks: List[Callable[[], None]] = []
+
+    def cancel(self, reason: str = "Query cancelled"):
+        with self.lock:
+            if self.event.is_set():
+                return
+            self.reason = reason
+            self.event.set()
+            callbacks = list(self.callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Cancel callback failed: {e}")
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.time() >= self.deadline
+
+    def is_cancelled(self) -> bool:
+        if not self.event.is_set() and self.expired():
+            self.cancel("Query deadline exceeded")
+        return self.event.is_set()
+
+    def check(self):
+        """Raise QueryCancelled if the job should stop"""
+        if self.is_cancelled():
+            raise QueryCancelled(self.reason)
+
+    @contextmanager
+    def on_cancel(self, callback: Callable[[], None]):
+        """Run callback if the token is cancelled while the block executes"""
+        with self.lock:
+            already_cancelled = self.event.is_set()
+            if not already_cancelled:
+                self.callbacks.append(callback)
+        if already_cancelled:
+            raise QueryCancelled(self.reason)
+        try:
+            yield
+        finally:
+            with self.lock:
+                if callback in self.callbacks:
+                    self.callbacks.remove(callback)
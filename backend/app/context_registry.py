@@ -0,0 +1,100 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+from .backends import ModelBackend
+from .metrics import CONTEXT_CACHE_EVENTS
+
+logger = logging.getLogger(__name__)
+
+
+def schema_fingerprint(schema: List[Dict]) -> str:
+    """Stable hash of a schema snapshot; identical databases share a fingerprint"""
+    canonical = json.dumps(schema, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class SchemaContext:
+    fingerprint: str
+    prompt_prefix: str
+    token_ids: List[int]
+    kv_state: Optional[Any] = None
+    size_bytes: int = 0
+    created_at: float = field(default_factory=time.time)
+
+
+class ContextRegistry:
+    """LRU cache of precomputed prompt prefixes (and KV state) keyed by schema fingerprint.
+
+    The prefix for a schema is built and prefilled once, then shared by every
+    session connected to a database with that schema. Entries are bounded by
+    count and, since saved llama.cpp states are large, by ``max_bytes`` of
+    model state; the most recent entry is always kept.
+    """
+
+    def __init__(self, backend: ModelBackend, build_prefix: Callable[[List[Dict]], str], max_entries: int = 16,
+                 max_bytes: Optional[int] = None):
+        self.backend = backend
+        self.build_prefix = build_prefix
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.entries: "OrderedDict[str, SchemaContext]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.build_locks: Dict[str, threading.Lock] = {}
+
+    def get(self, fingerprint: str) -> Optional[SchemaContext]:
+        with self.lock:
+            context = self.entries.get(fingerprint)
+            if context is not None:
+                self.entries.move_to_end(fingerprint)
+            return context
+
+    def __contains__(self, fingerprint: str) -> bool:
+        return fingerprint in self.entries
+
+    def get_or_build(self, schema: List[Dict], fingerprint: Optional[str] = None) -> SchemaContext:
+        fingerprint = fingerprint or schema_fingerprint(schema)
+        context = self.get(fingerprint)
+        if context is not None:
+            CONTEXT_CACHE_EVENTS.labels(event="hit").inc()
+            return context
+
+        with self.lock:
+            build_lock = self.build_locks.setdefault(fingerprint, threading.Lock())
+        # Concurrent requests for the same new schema wait for a single build
+        with build_lock:
+            context = self.get(fingerprint)
+            if context is not None:
+                CONTEXT_CACHE_EVENTS.labels(event="hit").inc()
+                return context
+            CONTEXT_CACHE_EVENTS.labels(event="miss").inc()
+            context = self._build(schema, fingerprint)
+
+        with self.lock:
+            self.entries[fingerprint] = context
+            self.total_bytes += context.size_bytes
+            self.build_locks.pop(fingerprint, None)
+            while len(self.entries) > self.max_entries or (
+                    self.max_bytes and self.total_bytes > self.max_bytes and len(self.entries) > 1):
+                evicted, evicted_context = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_context.size_bytes
+                CONTEXT_CACHE_EVENTS.labels(event="eviction").inc()
+                logger.info(f"Evicted schema context {evicted[:12]}")
+        return context
+
+    def _build(self, schema: List[Dict], fingerprint: str) -> SchemaContext:
+        start = time.perf_counter()
+        prompt_prefix = self.build_prefix(schema)
+        token_ids = self.backend.tokenize(prompt_prefix)
+        kv_state = self.backend.prefill(prompt_prefix)
+        size_bytes = self.backend.state_size(kv_state)
+        logger.info(f"✅ Built schema context {fingerprint[:12]} ({len(schema)} tables, {len(token_ids)} tokens, "
+                    f"{size_bytes / (1024 * 1024):.0f} MB state) in {time.perf_counter() - start:.2f}s")
+        return SchemaContext(fingerprint=fingerprint, prompt_prefix=prompt_prefix, token_ids=token_ids,
+                             kv_state=kv_state, size_bytes=size_bytes)
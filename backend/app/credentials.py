@@ -0,0 +1,61 @@
+import json
+import logging
+import os
+from typing import Dict, Optional
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:  # Without cryptography, secrets are simply never persisted
+    Fernet = None
+    InvalidToken = Exception
+
+logger = logging.getLogger(__name__)
+
+SECRET_FIELDS = ("password",)
+
+
+class ConnectionSealer:
+    """Protects database connection parameters before they go into the shared state store.
+
+    With a key (Fernet, from STATE_ENCRYPTION_KEY) the whole parameter set is
+    encrypted, so any process holding the key can reconnect. Without one,
+    secret fields are dropped: sessions opened with credentials then only work
+    in the process that opened them.
+    """
+
+    def __init__(self, key: Optional[str] = None):
+        self.fernet = None
+        if key:
+            if Fernet is None:
+                raise RuntimeError("STATE_ENCRYPTION_KEY requires the cryptography package")
+            self.fernet = Fernet(key.encode("utf-8"))
+
+    def seal(self, params: Optional[Dict]) -> Optional[Dict]:
+        if params is None:
+            return None
+        if self.fernet is not None:
+            token = self.fernet.encrypt(json.dumps(params).encode("utf-8"))
+            return {"encrypted": token.decode("ascii")}
+        return {key: value for key, value in params.items() if key not in SECRET_FIELDS}
+
+    def unseal(self, sealed: Optional[Dict]) -> Optional[Dict]:
+        """Connection parameters usable for reconnecting, or None if they cannot be recovered here"""
+        if not sealed:
+            return None
+        if "encrypted" in sealed:
+            if self.fernet is None:
+                logger.warning("Session connection is encrypted but STATE_ENCRYPTION_KEY is not set")
+                return None
+            try:
+                return json.loads(self.fernet.decrypt(sealed["encrypted"].encode("ascii")))
+            except InvalidToken:
+                logger.warning("Session connection was encrypted with a different STATE_ENCRYPTION_KEY")
+                return None
+        if sealed.get("type") == "credentials" and "password" not in sealed:
+            # Stored without its secret; only the process that opened the session can use it
+            return None
+        return sealed
+
+
+def create_sealer() -> ConnectionSealer:
+    return ConnectionSealer(os.getenv("STATE_ENCRYPTION_KEY"))
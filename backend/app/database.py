@@ -1,14 +1,18 @@
 import sqlite3
 import time
-from typing import Dict, List, Any, Optional
+from contextlib import nullcontext
+from typing import Callable, Dict, Iterator, List, Any, Optional, Tuple
 from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.exc import SQLAlchemyError
 from .models import Table, Column
+from .metrics import StageTimer
+from .cancellation import CancelToken, QueryCancelled
 
 class DatabaseManager:
     def __init__(self):
         self.engine = None
         self.connection_info = None
+        self.connection_params = None
 
     def connect_credentials(self, host: str, port: int, username: str, password: str, database: str, db_type: str = "postgresql") -> bool:
         try:
@@ -25,6 +29,10 @@ class DatabaseManager:
                 conn.execute(text("SELECT 1"))
             
             self.connection_info = {"type": "credentials", "host": host, "database": database}
+            self.connection_params = {
+                "type": "credentials", "host": host, "port": port, "username": username,
+                "password": password, "database": database, "db_type": db_type
+            }
             return True
         except Exception as e:
             raise Exception(f"Connection failed: {str(e)}")
@@ -39,10 +47,24 @@ class DatabaseManager:
                 conn.execute(text("SELECT 1"))
             
             self.connection_info = {"type": "file", "file": file_path}
+            self.connection_params = {"type": "file", "file": file_path}
             return True
         except Exception as e:
             raise Exception(f"SQLite connection failed: {str(e)}")
 
+    def connect_params(self, params: Dict[str, Any]) -> bool:
+        """Reconnect from connection_params saved by an earlier connect call"""
+        if params["type"] == "file":
+            return self.connect_sqlite(params["file"])
+        return self.connect_credentials(
+            host=params["host"],
+            port=params["port"],
+            username=params["username"],
+            password=params["password"],
+            database=params["database"],
+            db_type=params["db_type"]
+        )
+
     def get_schema(self) -> List[Table]:
         if not self.engine:
             raise Exception("No database connection")
@@ -82,36 +104,83 @@ class DatabaseManager:
         except Exception as e:
             raise Exception(f"Failed to get schema: {str(e)}")
 
-    def execute_query(self, sql: str) -> Dict[str, Any]:
+    def _interrupter(self, conn) -> Optional[Callable[[], None]]:
+        """Callable that aborts the statement running on conn from another thread"""
+        dbapi_connection = conn.connection.dbapi_connection
+        dialect = self.engine.dialect.name
+        if dialect == "sqlite":
+            return dbapi_connection.interrupt
+        if dialect == "postgresql":
+            return dbapi_connection.cancel
+        if dialect == "mysql":
+            thread_id = dbapi_connection.thread_id()
+            
+            def kill_query():
+                with self.engine.connect() as killer:
+                    killer.execute(text(f"KILL QUERY {int(thread_id)}"))
+            return kill_query
+        return None
+
+    def execute_query(self, sql: str, timer: Optional[StageTimer] = None,
+                      cancel_token: Optional[CancelToken] = None) -> Dict[str, Any]:
         if not self.engine:
             raise Exception("No database connection")
+        timer = timer or StageTimer()
         
         try:
             start_time = time.time()
             
             with self.engine.connect() as conn:
-                result = conn.execute(text(sql))
-                rows = result.fetchall()
-                columns = result.keys()
-                
-                # Convert to list of dictionaries
-                results = [dict(zip(columns, row)) for row in rows]
+                interrupter = self._interrupter(conn) if cancel_token else None
+                guard = cancel_token.on_cancel(interrupter) if interrupter else nullcontext()
+                with timer.stage("db_execution"), guard:
+                    result = conn.execute(text(sql))
+                    rows = result.fetchall()
+                    columns = list(result.keys())
             
             execution_time = time.time() - start_time
             
+            # Rows stay as tuples; they are encoded once per response format when the query completes
             return {
                 "sql": sql,
-                "results": results,
+                "columns": columns,
+                "rows": rows,
                 "execution_time": round(execution_time, 3)
             }
+        except QueryCancelled:
+            raise
         except Exception as e:
+            if cancel_token and cancel_token.is_cancelled():
+                raise QueryCancelled(cancel_token.reason)
             raise Exception(f"Query execution failed: {str(e)}")
 
+    def stream_query(self, sql: str, batch_size: int = 10000) -> Iterator[Tuple[List[str], List[Any]]]:
+        """Yield (columns, rows) batches from a server-side cursor so memory stays bounded by batch_size"""
+        if not self.engine:
+            raise Exception("No database connection")
+        
+        with self.engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(text(sql))
+            columns = list(result.keys())
+            empty = True
+            for rows in result.partitions(batch_size):
+                empty = False
+                yield columns, rows
+            if empty:
+                # Writers still need the column names to emit a valid empty file
+                yield columns, []
+
+    def hibernate(self):
+        """Close pooled connections but keep the engine; the next query reconnects lazily"""
+        if self.engine:
+            self.engine.dispose()
+
     def disconnect(self):
         if self.engine:
             self.engine.dispose()
             self.engine = None
             self.connection_info = None
+            self.connection_params = None
 
     def is_connected(self) -> bool:
         return self.engine is not None
\ No newline at end of file
@@ -0,0 +1,195 @@
+import csv
+import datetime
+import decimal
+import io
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from .serialization import arrow_array, pa
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+Batches = Iterable[Tuple[List[str], Sequence[Any]]]
+
+
+def available_export_formats() -> List[str]:
+    return [fmt for fmt in EXPORT_MEDIA_TYPES if fmt == "csv" or pa is not None]
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object whose contents are drained after every batch"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_csv(batches: Batches) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header_written = False
+    for columns, rows in batches:
+        if not header_written:
+            writer.writerow(columns)
+            header_written = True
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _family(value: Any) -> str:
+    # bool before int, datetime before date: each is a subclass of the latter
+    for family, types in (("bool", bool), ("int", int), ("float", float), ("decimal", decimal.Decimal),
+                          ("timestamp", datetime.datetime), ("date", datetime.date),
+                          ("string", str), ("binary", (bytes, bytearray, memoryview))):
+        if isinstance(value, types):
+            return family
+    return "other"
+
+
+class _ColumnTypes:
+    """Python value types seen in one result column, and the Arrow type that holds all of them losslessly"""
+
+    def __init__(self):
+        self.families = set()
+        self.scale = 0
+        self.digits = 0
+
+    def add(self, value: Any):
+        if value is None:
+            return
+        family = _family(value)
+        if family == "decimal" and not value.is_finite():
+            # NaN and infinities have no decimal128 representation
+            family = "other"
+        self.families.add(family)
+        if family == "decimal":
+            exponent = value.as_tuple().exponent
+            scale = max(0, -exponent)
+            self.scale = max(self.scale, scale)
+            self.digits = max(self.digits, len(value.as_tuple().digits) + max(0, exponent) - scale)
+        elif family == "int":
+            self.digits = max(self.digits, len(str(abs(value))))
+
+    def arrow_type(self):
+        families = self.families
+        if not families or families == {"string"}:
+            return pa.string()
+        if families <= {"bool"}:
+            return pa.bool_()
+        if families <= {"bool", "int"}:
+            return pa.int64()
+        if families <= {"bool", "int", "float"}:
+            return pa.float64()
+        if families <= {"bool", "int", "decimal"}:
+            precision = self.digits + self.scale
+            if precision <= 38:
+                return pa.decimal128(max(precision, 1), self.scale)
+        if families == {"timestamp"}:
+            return pa.timestamp("us")
+        if families == {"date"}:
+            return pa.date32()
+        if families == {"binary"}:
+            return pa.binary()
+        # Anything else (e.g. numbers mixed with text in a SQLite column) is exported as text
+        return pa.string()
+
+
+def scan_arrow_schema(batches: Batches):
+    """Arrow schema that every batch of a result converts to without loss.
+
+    Streamed formats fix their schema before the first byte is sent, and SQLite
+    columns may hold ints in one batch and floats or text in the next, so the
+    schema comes from a pass over the whole result rather than its first batch.
+    """
+    names: List[str] = []
+    types: Dict[int, _ColumnTypes] = {}
+    for columns, rows in batches:
+        names = columns
+        for row in rows:
+            for i, value in enumerate(row):
+                types.setdefault(i, _ColumnTypes()).add(value)
+    return pa.schema([(name, types.get(i, _ColumnTypes()).arrow_type()) for i, name in enumerate(names)])
+
+
+def _record_batch(rows: Sequence[Any], schema):
+    values = list(zip(*rows)) if rows else [() for _ in schema]
+    arrays = [arrow_array(list(column_values), type=field.type) for column_values, field in zip(values, schema)]
+    # Raises rather than coercing if the data no longer matches the scanned schema
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _stream_arrow_file(batches: Batches, open_writer, schema) -> Iterator[bytes]:
+    sink = _ChunkSink()
+    writer = open_writer(sink, schema)
+    for _, rows in batches:
+        writer.write(_record_batch(rows, schema))
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+    writer.close()
+    yield sink.drain()
+
+
+def stream_arrow(batches: Batches, schema) -> Iterator[bytes]:
+    """Arrow IPC stream, one record batch per database batch"""
+    return _stream_arrow_file(batches, lambda sink, schema: pa.ipc.new_stream(sink, schema), schema)
+
+
+def stream_parquet(batches: Batches, schema) -> Iterator[bytes]:
+    """Parquet file, one row group per database batch"""
+    import pyarrow.parquet as pq
+
+    class _Writer:
+        def __init__(self, sink, schema):
+            self.writer = pq.ParquetWriter(sink, schema, compression="snappy")
+
+        def write(self, batch):
+            self.writer.write_batch(batch)
+
+        def close(self):
+            self.writer.close()
+
+    return _stream_arrow_file(batches, _Writer, schema)
+
+
+WRITERS = {
+    "csv": stream_csv,
+    "parquet": stream_parquet,
+    "arrow": stream_arrow,
+}
+
+
+# Formats with a fixed binary schema, which needs a scan_arrow_schema pass first
+TYPED_FORMATS = ("parquet", "arrow")
+
+
+def stream_export(batches: Batches, fmt: str, schema=None) -> Iterator[bytes]:
+    """Encode database batches incrementally in the given export format.
+
+    ``schema`` is required for TYPED_FORMATS; compute it with ``scan_arrow_schema``
+    over the same result.
+    """
+    if fmt in TYPED_FORMATS:
+        return WRITERS[fmt](batches, schema)
+    return WRITERS[fmt](batches)
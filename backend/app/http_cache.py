@@ -0,0 +1,95 @@
+import gzip
+import os
+from typing import Callable, Dict, Optional
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available
+    brotli = None
+
+# Bodies smaller than this are sent as-is; compression overhead outweighs the savings
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+# Clients may cache but must revalidate, since schemas and sessions can change at any time
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts: str) -> str:
+    return '"' + "-".join(parts) + '"'
+
+
+def _coded(etag: str, encoding: str) -> str:
+    # Strong validators must differ between content codings of the same representation
+    return etag[:-1] + f"-{encoding}" + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether If-None-Match matches the ETag in any of its content codings.
+
+    Uses the weak comparison RFC 7232 prescribes for If-None-Match, so tags
+    weakened by a compressing proxy still match.
+    """
+    if not if_none_match:
+        return False
+    candidates = {value.strip().removeprefix("W/") for value in if_none_match.split(",")}
+    if "*" in candidates:
+        return True
+    return any(variant in candidates for variant in [etag] + [_coded(etag, e) for e in ("gzip", "br")])
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Preferred content coding the client accepts: br when available, then gzip"""
+    offered = {}
+    for part in (accept_encoding or "").split(","):
+        pieces = part.strip().split(";")
+        coding = pieces[0].strip().lower()
+        quality = 1.0
+        for param in pieces[1:]:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            offered[coding] = quality
+    if brotli is not None and offered.get("br", 0) > 0:
+        return "br"
+    if offered.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        # Quality 5 keeps compression fast enough for per-request use
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"})
+
+
+def cached_response(body: bytes, media_type: str, etag: str, accept_encoding: Optional[str] = None,
+                    load_compressed: Optional[Callable[[str], Optional[bytes]]] = None,
+                    save_compressed: Optional[Callable[[str, bytes], None]] = None) -> Response:
+    """Response with validators and, for large bodies, content coding.
+
+    ``load_compressed``/``save_compressed`` let callers keep compressed variants
+    of stored payloads so each is only compressed once.
+    """
+    headers: Dict[str, str] = {"Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    encoding = negotiate_encoding(accept_encoding) if len(body) >= COMPRESSION_MIN_BYTES else None
+    if encoding:
+        compressed = load_compressed(encoding) if load_compressed else None
+        if compressed is None:
+            compressed = compress(body, encoding)
+            if save_compressed:
+                save_compressed(encoding, compressed)
+        body = compressed
+        headers["Content-Encoding"] = encoding
+        etag = _coded(etag, encoding)
+    headers["ETag"] = etag
+    return Response(content=body, media_type=media_type, headers=headers)
+
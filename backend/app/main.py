@@ -1,10 +1,12 @@
 from fastapi import FastAPI, HTTPException, UploadFile, File, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 import os
 import tempfile
 import logging
 import asyncio
+import hmac
+import time
 from typing import Optional
 from contextlib import asynccontextmanager
 from .models import (
@@ -16,6 +18,13 @@ from .database import DatabaseManager
 from .nlp_service import NLPService
 from .session_manager import SessionManager
 from .query_queue import QueryQueue, QueryStatus
+from .state_store import create_state_store
+from .worker import QueryWorker, value_index_loop
+from .context_registry import schema_fingerprint
+from .profiling import create_profiler, summarize_profile
+from . import serialization, http_cache
+from .export import EXPORT_MEDIA_TYPES, TYPED_FORMATS, available_export_formats, scan_arrow_schema, stream_export
+from .metrics import QUEUE_DEPTH, ACTIVE_SESSIONS, render_metrics, CONTENT_TYPE_LATEST
 
 
 
@@ -31,80 +40,44 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting Text to SQL Converter API...")
     logger.info("Initializing session manager...")
-    logger.info("Initializing NLP service (this may take a few minutes on first run)...")
     
     # Start background tasks
     cleanup_task = asyncio.create_task(session_cleanup_task())
-    queue_processor_task = asyncio.create_task(query_processor_task())
+    queue_processor_task = asyncio.create_task(query_worker.run()) if query_worker else None
+    # Profiling runs where queries run; with INFERENCE_MODE=remote the inference workers own it
+    value_index_task = asyncio.create_task(value_index_loop(session_manager)) if query_worker else None
     
     yield
     
     # Shutdown
     cleanup_task.cancel()
-    queue_processor_task.cancel()
+    if value_index_task:
+        value_index_task.cancel()
+    if queue_processor_task:
+        queue_processor_task.cancel()
     logger.info("Shutting down Text to SQL Converter API...")
 
 app = FastAPI(title="Text to SQL Converter API", lifespan=lifespan)
 
 async def session_cleanup_task():
-    """Background task to clean up expired sessions every 5 minutes"""
+    """Background task to expire sessions and hibernate idle connections"""
+    interval = int(os.getenv("SESSION_CLEANUP_INTERVAL", "30"))
+    last_query_cleanup = time.time()
     while True:
         try:
-            await asyncio.sleep(300)  # 5 minutes
+            await asyncio.sleep(interval)
+            # Cheap when nothing is due, so it can run often enough to release idle pools promptly
             session_manager.cleanup_expired_sessions()
-            query_queue.cleanup_old_queries()
-            logger.info(f"Session cleanup completed. Active sessions: {session_manager.get_session_count()}")
+            # Settles jobs left processing by a worker that died, also when no worker is polling
+            query_queue.recover_stale_jobs()
+            if time.time() - last_query_cleanup >= 300:
+                query_queue.cleanup_old_queries()
+                last_query_cleanup = time.time()
         except asyncio.CancelledError:
             break
         except Exception as e:
             logger.error(f"Error in session cleanup: {e}")
 
-async def query_processor_task():
-    """Background task to process queued queries"""
-    while True:
-        try:
-            query_id = await query_queue.get_next_query()
-            if query_id:
-                await process_query(query_id)
-        except asyncio.CancelledError:
-            break
-        except Exception as e:
-            logger.error(f"Error in query processor: {e}")
-
-async def process_query(query_id: str):
-    """Process a single query from the queue"""
-    queued_query = query_queue.get_query_status(query_id)
-    if not queued_query:
-        return
-    
-    query_queue.update_query_status(query_id, QueryStatus.PROCESSING)
-    
-    try:
-        db_manager = session_manager.get_session(queued_query.session_id)
-        if not db_manager or not db_manager.is_connected():
-            raise Exception("No database connection for session")
-        
-        # Process query asynchronously
-        def process_nlp_query():
-            schema = db_manager.get_schema()
-            schema_dict = [table.dict() for table in schema]
-            sql = nlp_service.text_to_sql(queued_query.query, schema_dict, queued_query.context)
-            result = db_manager.execute_query(sql)
-            explanation = nlp_service.get_explanation(sql, queued_query.query)
-            return {
-                "sql": result["sql"],
-                "results": result["results"],
-                "execution_time": result["execution_time"],
-                "explanation": explanation
-            }
-        
-        query_result = await asyncio.get_event_loop().run_in_executor(None, process_nlp_query)
-        query_queue.update_query_status(query_id, QueryStatus.COMPLETED, result=query_result)
-        
-    except Exception as e:
-        error_message = nlp_service.format_error_with_query(str(e), "", queued_query.query) if hasattr(nlp_service, 'format_error_with_query') else str(e)
-        query_queue.update_query_status(query_id, QueryStatus.FAILED, error=error_message)
-
 # CORS configuration for different environments
 allowed_origins = [
     "http://localhost:5173",  # Vite dev server
@@ -124,10 +97,18 @@ app.add_middleware(
     allow_credentials=True,
 )
 
-# Global instances
-session_manager = SessionManager()
-nlp_service = NLPService()
-query_queue = QueryQueue()
+# Global instances. Session, job and schema state live in the shared store (STATE_STORE_URL);
+# with INFERENCE_MODE=remote the model runs in separate `python -m app.worker` processes.
+state_store = create_state_store()
+session_manager = SessionManager(store=state_store)
+query_queue = QueryQueue(state_store)
+inference_mode = os.getenv("INFERENCE_MODE", "local")
+nlp_service = None
+query_worker = None
+if inference_mode == "local":
+    logger.info("Initializing NLP service (this may take a few minutes on first run)...")
+    nlp_service = NLPService()
+    query_worker = QueryWorker(query_queue, session_manager, nlp_service, profiler=create_profiler(state_store))
 
 @app.get("/")
 def read_root():
@@ -162,6 +143,7 @@ async def connect_database(credentials: DatabaseCredentials):
             raise HTTPException(status_code=400, detail="File upload not implemented in this endpoint")
         
         if success:
+            session_manager.save_connection(session_id)
             return ConnectionResponse(
                 success=True,
                 message="Connected successfully",
@@ -178,8 +160,8 @@ async def connect_database_file(file: UploadFile = File(...)):
         session_id = session_manager.create_session()
         db_manager = session_manager.get_session(session_id)
         
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".db") as tmp_file:
+        # Save uploaded file; UPLOAD_DIR should be a shared volume when running several API nodes
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".db", dir=os.getenv("UPLOAD_DIR")) as tmp_file:
             content = await file.read()
             tmp_file.write(content)
             tmp_file_path = tmp_file.name
@@ -187,6 +169,7 @@ async def connect_database_file(file: UploadFile = File(...)):
         success = db_manager.connect_sqlite(tmp_file_path)
         
         if success:
+            session_manager.save_connection(session_id)
             return ConnectionResponse(
                 success=True,
                 message="Connected successfully",
@@ -199,27 +182,47 @@ async def connect_database_file(file: UploadFile = File(...)):
             os.unlink(tmp_file_path)
         raise HTTPException(status_code=400, detail=str(e))
 
+def schema_response(session_id: str, tables, if_none_match: Optional[str], accept_encoding: Optional[str]) -> Response:
+    etag = http_cache.make_etag(session_manager.get_schema_fingerprint(session_id) or schema_fingerprint(tables))
+    if http_cache.etag_matches(if_none_match, etag):
+        return http_cache.not_modified(etag)
+    body = serialization.dumps({"tables": tables})
+    return http_cache.cached_response(body, "application/json", etag, accept_encoding)
+
 @app.get("/api/schema", response_model=SchemaResponse)
-async def get_schema(session_id: str = Header(..., alias="X-Session-ID")):
+async def get_schema(session_id: str = Header(..., alias="X-Session-ID"), if_none_match: Optional[str] = Header(None),
+                     accept_encoding: Optional[str] = Header(None)):
+    """Schema snapshot, validated by an ETag derived from the schema fingerprint"""
     try:
         db_manager = session_manager.get_session(session_id)
         if not db_manager or not db_manager.is_connected():
             raise HTTPException(status_code=400, detail="No database connection for session")
         
-        tables = db_manager.get_schema()
-        return SchemaResponse(tables=tables)
+        # Answer revalidation from the stored fingerprint without loading or encoding the schema
+        fingerprint = session_manager.get_schema_fingerprint(session_id)
+        if fingerprint and http_cache.etag_matches(if_none_match, http_cache.make_etag(fingerprint)):
+            return http_cache.not_modified(http_cache.make_etag(fingerprint))
+        
+        tables = session_manager.get_schema(session_id)
+        return schema_response(session_id, tables, if_none_match, accept_encoding)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/schema/refresh", response_model=SchemaResponse)
-async def refresh_schema(session_id: str = Header(..., alias="X-Session-ID")):
+async def refresh_schema(session_id: str = Header(..., alias="X-Session-ID"), if_none_match: Optional[str] = Header(None),
+                         accept_encoding: Optional[str] = Header(None)):
+    """Re-reflect the schema; 304 when it did not change since the client's copy"""
     try:
         db_manager = session_manager.get_session(session_id)
         if not db_manager or not db_manager.is_connected():
             raise HTTPException(status_code=400, detail="No database connection for session")
         
-        tables = db_manager.get_schema()
-        return SchemaResponse(tables=tables)
+        tables = session_manager.get_schema(session_id, refresh=True)
+        return schema_response(session_id, tables, if_none_match, accept_encoding)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -232,7 +235,7 @@ async def submit_query(request: QueryRequest):
             raise HTTPException(status_code=400, detail="No database connection for session")
         
         # Add query to queue
-        query_id = await query_queue.add_query(request.session_id, request.query, request.context)
+        query_id = await query_queue.add_query(request.session_id, request.query, request.context, timeout=request.timeout)
         
         return QuerySubmitResponse(
             query_id=query_id,
@@ -245,34 +248,166 @@ async def submit_query(request: QueryRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def load_result_payload(query_id: str, fmt: str) -> Optional[bytes]:
+    """Encoded result for a completed query; formats not encoded at completion are derived once and stored"""
+    payload = query_queue.get_result_payload(query_id, fmt)
+    if payload is None and fmt not in serialization.EAGER_FORMATS:
+        columnar = query_queue.get_result_payload(query_id, "columnar")
+        if columnar is None:
+            return None
+        payload = serialization.encode_result(serialization.decode_columnar(columnar), fmt)
+        query_queue.save_result_payload(query_id, fmt, payload)
+    return payload
+
+def result_etag(queued_query, *parts: str) -> Optional[str]:
+    """ETag of a completed query's result, or None for results stored without one"""
+    if queued_query.status != QueryStatus.COMPLETED or not (queued_query.result or {}).get("etag"):
+        return None
+    return http_cache.make_etag(queued_query.result["etag"], *parts)
+
 @app.get("/api/query/{query_id}/status", response_model=QueryStatusResponse)
-async def get_query_status(query_id: str):
+async def get_query_status(query_id: str, format: str = "json", if_none_match: Optional[str] = Header(None),
+                           accept_encoding: Optional[str] = Header(None)):
+    """Poll a query. `format=columnar` returns the result as column arrays instead of row objects.
+    Live system stats are included while the query is pending. Once completed the response is
+    built only from the stored job and carries an ETag, so repeated polls can be answered with 304."""
     try:
+        if format not in serialization.EAGER_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Status results support formats: {', '.join(serialization.EAGER_FORMATS)}")
+        
         queued_query = query_queue.get_query_status(query_id)
         if not queued_query:
             raise HTTPException(status_code=404, detail="Query not found")
         
+        etag = result_etag(queued_query, "status", format)
+        if etag and http_cache.etag_matches(if_none_match, etag):
+            return http_cache.not_modified(etag)
+        
+        # Live stats would make a completed (tagged) body change under the same ETag, so they are only sent while pending
+        stats = None if etag else get_system_stats().dict()
+        
+        # The result was serialized when the query completed; splice the stored bytes into the
+        # envelope instead of validating every row through pydantic on each poll
+        envelope = serialization.dumps({
+            "query_id": query_id,
+            "status": queued_query.status.value,
+            "error": queued_query.error,
+            "created_at": queued_query.created_at.isoformat(),
+            "stats": stats,
+            "timings": queued_query.timings or None
+        })
         result = None
-        if queued_query.status == QueryStatus.COMPLETED and queued_query.result:
-            result = QueryResponse(**queued_query.result)
+        if queued_query.status == QueryStatus.COMPLETED:
+            result = await asyncio.get_event_loop().run_in_executor(None, load_result_payload, query_id, format)
+        body = envelope[:-1] + b',"result":' + (result or b"null") + b"}"
+        if not etag:
+            return Response(content=body, media_type="application/json")
+        # A tagged body never changes, so its compressed variants are stored like those of /result
+        return await asyncio.get_event_loop().run_in_executor(None, lambda: http_cache.cached_response(
+            body, "application/json", etag, accept_encoding,
+            load_compressed=lambda encoding: query_queue.get_result_payload(query_id, f"status.{format}.{encoding}"),
+            save_compressed=lambda encoding, data: query_queue.save_result_payload(query_id, f"status.{format}.{encoding}", data)
+        ))
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/api/query/{query_id}")
+async def cancel_query(query_id: str):
+    """Cancel a queued or running query; running ones stop at the next token or DB interrupt"""
+    try:
+        status = query_queue.cancel_query(query_id)
+        if status is None:
+            raise HTTPException(status_code=404, detail="Query not found")
+        if status in (QueryStatus.COMPLETED, QueryStatus.FAILED):
+            raise HTTPException(status_code=409, detail=f"Query already {status.value}")
         
-        # Include system stats in response
-        stats = get_system_stats()
+        message = "Query cancelled" if status == QueryStatus.CANCELLED else "Cancellation requested"
+        return {"query_id": query_id, "status": status.value, "message": message}
         
-        return QueryStatusResponse(
-            query_id=query_id,
-            status=queued_query.status.value,
-            result=result,
-            error=queued_query.error,
-            created_at=queued_query.created_at.isoformat(),
-            stats=stats
-        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/query/{query_id}/result")
+async def get_query_result(query_id: str, format: Optional[str] = None, accept: Optional[str] = Header(None),
+                           if_none_match: Optional[str] = Header(None), accept_encoding: Optional[str] = Header(None)):
+    """Completed query result as JSON, columnar JSON, NDJSON or Arrow IPC (via ?format= or Accept)"""
+    try:
+        try:
+            fmt = serialization.negotiate_format(format, accept)
+        except ValueError as e:
+            raise HTTPException(status_code=406, detail=str(e))
+        
+        queued_query = query_queue.get_query_status(query_id)
+        if not queued_query:
+            raise HTTPException(status_code=404, detail="Query not found")
+        if queued_query.status != QueryStatus.COMPLETED:
+            raise HTTPException(status_code=409, detail=f"Query is {queued_query.status.value}")
+        
+        etag = result_etag(queued_query, fmt)
+        if etag and http_cache.etag_matches(if_none_match, etag):
+            return http_cache.not_modified(etag)
+        
+        payload = await asyncio.get_event_loop().run_in_executor(None, load_result_payload, query_id, fmt)
+        if payload is None:
+            raise HTTPException(status_code=404, detail="Query result not available")
+        if not etag:
+            return Response(content=payload, media_type=serialization.MEDIA_TYPES[fmt])
+        # Compressed variants are stored next to the payload so each is only compressed once
+        return await asyncio.get_event_loop().run_in_executor(None, lambda: http_cache.cached_response(
+            payload, serialization.MEDIA_TYPES[fmt], etag, accept_encoding,
+            load_compressed=lambda encoding: query_queue.get_result_payload(query_id, f"{fmt}.{encoding}"),
+            save_compressed=lambda encoding, data: query_queue.save_result_payload(query_id, f"{fmt}.{encoding}", data)
+        ))
         
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/query/{query_id}/export")
+async def export_query(query_id: str, format: str = "csv"):
+    """Stream the full result of a completed query as CSV, Parquet or Arrow IPC.
+
+    The query's SQL is re-run with a server-side cursor and encoded batch by
+    batch, so memory stays flat regardless of row count. Chunks are produced
+    only as fast as the client reads them.
+    """
+    if format not in available_export_formats():
+        raise HTTPException(status_code=400, detail=f"Unsupported export format. Available: {', '.join(available_export_formats())}")
+    
+    queued_query = query_queue.get_query_status(query_id)
+    if not queued_query:
+        raise HTTPException(status_code=404, detail="Query not found")
+    if queued_query.status != QueryStatus.COMPLETED or not queued_query.result:
+        raise HTTPException(status_code=409, detail=f"Query is {queued_query.status.value}")
+    
+    db_manager = session_manager.get_session(queued_query.session_id)
+    if not db_manager or not db_manager.is_connected():
+        raise HTTPException(status_code=400, detail="No database connection for session")
+    
+    sql = queued_query.result["sql"]
+    batch_size = int(os.getenv("EXPORT_BATCH_ROWS", "10000"))
+    schema = None
+    if format in TYPED_FORMATS:
+        # Typed formats need column types that fit every batch before the response starts
+        try:
+            schema = await asyncio.get_event_loop().run_in_executor(
+                None, lambda: scan_arrow_schema(db_manager.stream_query(sql, batch_size=batch_size)))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    batches = db_manager.stream_query(sql, batch_size=batch_size)
+    extension = "arrows" if format == "arrow" else format
+    return StreamingResponse(
+        stream_export(batches, format, schema),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="query-{query_id[:8]}.{extension}"'}
+    )
+
 @app.get("/api/connection/status")
 async def connection_status(session_id: str = Header(..., alias="X-Session-ID")):
     db_manager = session_manager.get_session(session_id)
@@ -287,32 +422,35 @@ async def connection_status(session_id: str = Header(..., alias="X-Session-ID"))
 @app.post("/api/disconnect")
 async def disconnect(session_id: str = Header(..., alias="X-Session-ID")):
     try:
+        # Drops only this session's connection, schema snapshot and context state
         session_manager.cleanup_session(session_id)
-        # Clear context when disconnecting
-        nlp_service.context_loaded = False
-        nlp_service.loaded_schema = None
         return {"success": True, "message": "Disconnected successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 def get_system_stats() -> SystemStats:
     """Get current system statistics"""
-    total_queries = len(query_queue.queries)
-    queued = sum(1 for q in query_queue.queries.values() if q.status == QueryStatus.QUEUED)
-    processing = sum(1 for q in query_queue.queries.values() if q.status == QueryStatus.PROCESSING)
-    completed = sum(1 for q in query_queue.queries.values() if q.status == QueryStatus.COMPLETED)
-    failed = sum(1 for q in query_queue.queries.values() if q.status == QueryStatus.FAILED)
+    counts = query_queue.status_counts()
     
     return SystemStats(
         active_sessions=session_manager.get_session_count(),
-        total_queries=total_queries,
-        queued=queued,
-        processing=processing,
-        completed=completed,
-        failed=failed,
-        queue_size=query_queue.queue.qsize()
+        total_queries=sum(counts.values()),
+        queued=counts[QueryStatus.QUEUED],
+        processing=counts[QueryStatus.PROCESSING],
+        completed=counts[QueryStatus.COMPLETED],
+        failed=counts[QueryStatus.FAILED],
+        cancelled=counts[QueryStatus.CANCELLED],
+        queue_size=query_queue.queue_size(),
+        template_hit_rate=nlp_service.templates.hit_rate() if nlp_service else None
     )
 
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint"""
+    QUEUE_DEPTH.set(query_queue.queue_size())
+    ACTIVE_SESSIONS.set(session_manager.get_session_count())
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/api/system/stats", response_model=SystemStats)
 async def get_stats():
     """Get current system statistics - lightweight endpoint"""
@@ -321,45 +459,57 @@ async def get_stats():
 @app.post("/api/sessions/cleanup")
 async def cleanup_expired_sessions():
     """Manually trigger cleanup of expired sessions"""
-    session_manager.cleanup_expired_sessions()
+    cleaned = session_manager.cleanup_expired_sessions()
     return {
         "success": True,
         "stats": get_system_stats(),
-        "message": "Expired sessions cleaned up"
+        "message": f"Expired {cleaned['expired']} sessions, hibernated {cleaned['hibernated']} idle connections"
     }
 
+def require_admin(token: Optional[str]):
+    """Admin endpoints are disabled unless ADMIN_TOKEN is set, and then require it in X-Admin-Token"""
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them")
+    if not token or not hmac.compare_digest(token, admin_token):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@app.get("/api/admin/profiles")
+async def list_profiles(admin_token: Optional[str] = Header(None, alias="X-Admin-Token")):
+    """Profiles captured for jobs slower than SLOW_JOB_THRESHOLD, newest first"""
+    require_admin(admin_token)
+    profiles = await asyncio.get_event_loop().run_in_executor(None, state_store.list_profiles)
+    return {"profiles": [summarize_profile(profile) for profile in profiles]}
+
+@app.get("/api/admin/profiles/{profile_id}")
+async def get_profile(profile_id: str, admin_token: Optional[str] = Header(None, alias="X-Admin-Token")):
+    """Full capture for one slow job: stack samples or cProfile output, memory snapshot and timings"""
+    require_admin(admin_token)
+    profile = await asyncio.get_event_loop().run_in_executor(None, state_store.load_profile, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(content=serialization.dumps(profile), media_type="application/json")
+
 @app.post("/api/context/load", response_model=ContextLoadResponse)
 async def load_context(session_id: str = Header(..., alias="X-Session-ID")):
-    """Load database schema context to the model and execute sample queries"""
+    """Load database schema context to the model"""
     try:
         db_manager = session_manager.get_session(session_id)
         if not db_manager or not db_manager.is_connected():
             raise HTTPException(status_code=400, detail="No database connection for session")
         
         # Get schema
-        schema = db_manager.get_schema()
+        schema = session_manager.get_schema(session_id)
         if not schema:
             raise HTTPException(status_code=400, detail="No tables found in database")
         
-        # Load context and test query asynchronously
-        async def load_and_test():
-            # Load context to NLP service
-            context_loaded = nlp_service.load_context(schema)
+        # Build the shared schema context once per distinct schema; later sessions on
+        # the same database reuse it. Without a local model, workers build it on first query.
+        if nlp_service:
+            context_loaded = await asyncio.get_event_loop().run_in_executor(None, nlp_service.load_context, schema)
             if not context_loaded:
                 raise Exception("Failed to load context to AI model")
-            
-            # Test with NLP query for first table
-            if schema:
-                first_table = schema[0]
-                nlp_query = f"Select 1 row of the {first_table.name}"
-                schema_dict = [table.dict() for table in schema]
-                generated_sql = nlp_service.text_to_sql(nlp_query, schema_dict)
-                db_manager.execute_query(generated_sql)
-            
-            return True
-        
-        # Execute asynchronously
-        await asyncio.get_event_loop().run_in_executor(None, load_and_test)
+        session_manager.set_context_loaded(session_id)
         
         return ContextLoadResponse(
             success=True,
@@ -376,9 +526,10 @@ async def load_context(session_id: str = Header(..., alias="X-Session-ID")):
 @app.get("/api/context/status")
 async def get_context_status(session_id: str = Header(..., alias="X-Session-ID")):
     """Get context loading status"""
+    loaded = session_manager.is_context_loaded(session_id)
     return {
-        "loaded": nlp_service.is_context_loaded(),
-        "message": "Context loaded" if nlp_service.is_context_loaded() else "Context not loaded"
+        "loaded": loaded,
+        "message": "Context loaded" if loaded else "Context not loaded"
     }
 
 @app.get("/api/sample-database")
@@ -0,0 +1,130 @@
+import os
+import time
+import logging
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+
+logger = logging.getLogger(__name__)
+
+# Stage latency buckets span sub-millisecond DB lookups up to multi-minute generations
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+STAGE_SECONDS = Histogram(
+    "texttosql_stage_seconds",
+    "Time spent in each stage of the query pipeline",
+    ["stage"],
+    buckets=STAGE_BUCKETS
+)
+PROMPT_TOKENS = Histogram(
+    "texttosql_prompt_tokens",
+    "Number of prompt tokens sent to the model",
+    buckets=(64, 128, 256, 512, 768, 1024, 1536, 2048, 4096)
+)
+TOKENS_PER_SECOND = Histogram(
+    "texttosql_generation_tokens_per_second",
+    "Decode throughput of the model",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)
+)
+QUERIES_TOTAL = Counter(
+    "texttosql_queries_total",
+    "Queries processed, by final status",
+    ["status"]
+)
+CONTEXT_CACHE_EVENTS = Counter(
+    "texttosql_context_cache_total",
+    "Schema context registry lookups, by outcome (hit, miss, eviction)",
+    ["event"]
+)
+SQL_TEMPLATE_EVENTS = Counter(
+    "texttosql_sql_template_total",
+    "SQL template cache events (hit, miss, learned, rejected)",
+    ["event"]
+)
+QUEUE_DEPTH = Gauge(
+    "texttosql_queue_depth",
+    "Queries waiting in the processing queue"
+)
+ACTIVE_SESSIONS = Gauge(
+    "texttosql_active_sessions",
+    "Sessions currently held by the API"
+)
+
+# Optional OpenTelemetry export, enabled when an OTLP endpoint is configured
+_tracer = None
+if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+    try:
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        provider = TracerProvider(resource=Resource.create({
+            "service.name": os.getenv("OTEL_SERVICE_NAME", "texttosql-backend")
+        }))
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        trace.set_tracer_provider(provider)
+        _tracer = trace.get_tracer(__name__)
+        logger.info("OpenTelemetry export enabled")
+    except ImportError:
+        logger.warning("OTEL_EXPORTER_OTLP_ENDPOINT is set but opentelemetry packages are not installed")
+
+
+class StageTimer:
+    """Collects per-stage timings for a single query and exports them"""
+
+    def __init__(self, timings: Optional[Dict[str, float]] = None):
+        self.timings = timings if timings is not None else {}
+        self.spans: List[Tuple[str, int, int]] = []
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the enclosed block as pipeline stage `name`"""
+        start_ns = time.time_ns()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, start_ns=start_ns)
+
+    def record(self, name: str, seconds: float, start_ns: Optional[int] = None):
+        """Record a stage duration that was measured elsewhere"""
+        self.timings[name] = round(seconds, 4)
+        STAGE_SECONDS.labels(stage=name).observe(seconds)
+        if start_ns is not None:
+            self.spans.append((name, start_ns, start_ns + int(seconds * 1e9)))
+
+    def record_generation(self, prompt_tokens: int, completion_tokens: int, ttft: float, decode_seconds: float):
+        """Record token counters and throughput for one model generation"""
+        self.timings["prompt_tokens"] = prompt_tokens
+        self.timings["completion_tokens"] = completion_tokens
+        self.record("time_to_first_token", ttft)
+        PROMPT_TOKENS.observe(prompt_tokens)
+        if decode_seconds > 0 and completion_tokens > 0:
+            tokens_per_second = completion_tokens / decode_seconds
+            self.timings["tokens_per_second"] = round(tokens_per_second, 2)
+            TOKENS_PER_SECOND.observe(tokens_per_second)
+
+    def export_trace(self, query_id: str, enqueued_ns: int, status: str):
+        """Emit the recorded stages as an OpenTelemetry trace, if enabled"""
+        if _tracer is None:
+            return
+        try:
+            root = _tracer.start_span("query", start_time=enqueued_ns)
+            root.set_attribute("query.id", query_id)
+            root.set_attribute("query.status", status)
+            for key, value in self.timings.items():
+                root.set_attribute(f"query.{key}", value)
+            context = trace.set_span_in_context(root)
+            for name, start_ns, end_ns in self.spans:
+                span = _tracer.start_span(name, context=context, start_time=start_ns)
+                span.end(end_time=end_ns)
+            root.end()
+        except Exception as e:
+            logger.warning(f"Failed to export trace for query {query_id}: {e}")
+
+
+def render_metrics() -> bytes:
+    """Render all registered metrics in the Prometheus text format"""
+    return generate_latest()
@@ -0,0 +1,311 @@
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+HASH_BLOCK_SIZE = 8 * 1024 * 1024
+# Hosts the download token is sent to; CDN redirects and mirrors never see it
+TOKEN_HOSTS = ("huggingface.co",)
+
+
+class ChecksumMismatch(Exception):
+    pass
+
+
+class DownloadProgress:
+    """Byte-level progress of one download, logged periodically from a background thread"""
+
+    def __init__(self, filename: str, total: int, downloaded: int = 0, interval: float = 5.0,
+                 callback: Optional[Callable[[int, int], None]] = None):
+        self.filename = filename
+        self.total = total
+        self.downloaded = downloaded
+        self.interval = interval
+        self.callback = callback
+        self.started = time.time()
+        self.resumed_from = downloaded
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+
+    def add(self, nbytes: int):
+        with self.lock:
+            self.downloaded += nbytes
+        if self.callback:
+            self.callback(self.downloaded, self.total)
+
+    def log(self):
+        elapsed = max(time.time() - self.started, 1e-6)
+        speed_mb = (self.downloaded - self.resumed_from) / elapsed / (1024 * 1024)
+        done_mb = self.downloaded / (1024 * 1024)
+        if self.total:
+            total_mb = self.total / (1024 * 1024)
+            logger.info(f"📥 {self.filename}: {self.downloaded / self.total * 100:.1f}% "
+                        f"({done_mb:.1f}/{total_mb:.1f} MB, {speed_mb:.1f} MB/s)")
+        else:
+            logger.info(f"📥 {self.filename}: {done_mb:.1f} MB ({speed_mb:.1f} MB/s)")
+        sys.stdout.flush()
+
+    def start(self) -> threading.Thread:
+        def report():
+            while not self.done.wait(self.interval):
+                self.log()
+
+        thread = threading.Thread(target=report, daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.done.set()
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ModelArtifactManager:
+    """Fetches model files into a local cache and verifies them.
+
+    Files come from a local mirror directory (e.g. a shared volume) when present,
+    otherwise from a mirror URL or the origin URL using parallel ranged requests.
+    Partial downloads resume chunk by chunk after a restart. A file's SHA-256 is
+    computed once and cached by path, size and mtime, so later startups skip
+    re-hashing multi-gigabyte files. The token is only sent to ``token_hosts``.
+    """
+
+    def __init__(self, cache_dir: str = "./models", mirror: Optional[str] = None, workers: int = 8,
+                 chunk_size: int = 32 * 1024 * 1024, token: Optional[str] = None, timeout: float = 60,
+                 progress_interval: float = 5.0, progress_callback: Optional[Callable[[int, int], None]] = None,
+                 token_hosts: Tuple[str, ...] = TOKEN_HOSTS):
+        self.cache_dir = cache_dir
+        self.mirror = mirror
+        self.workers = max(1, workers)
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.progress_interval = progress_interval
+        self.progress_callback = progress_callback
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.token = token
+        self.token_hosts = {host.lower() for host in token_hosts}
+
+    def _headers(self, url: str, **headers: str) -> Dict[str, str]:
+        """Request headers for url, with the token only when it points at a token host"""
+        if self.token and urlparse(url).netloc.lower() in self.token_hosts:
+            headers["Authorization"] = f"Bearer {self.token}"
+        return headers
+
+    # Checksums
+
+    def _checksum_record_path(self, path: str) -> str:
+        key = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, ".checksums", f"{key}.json")
+
+    def checksum(self, path: str) -> str:
+        """SHA-256 of a file, reusing the cached digest while size and mtime are unchanged"""
+        stat = os.stat(path)
+        record_path = self._checksum_record_path(path)
+        try:
+            with open(record_path) as f:
+                record = json.load(f)
+            if record["size"] == stat.st_size and record["mtime_ns"] == stat.st_mtime_ns:
+                return record["sha256"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+        start = time.perf_counter()
+        digest = sha256_file(path)
+        logger.info(f"🔐 Hashed {os.path.basename(path)} in {time.perf_counter() - start:.1f}s")
+        self._record_checksum(path, digest)
+        return digest
+
+    def _record_checksum(self, path: str, digest: str):
+        stat = os.stat(path)
+        record_path = self._checksum_record_path(path)
+        os.makedirs(os.path.dirname(record_path), exist_ok=True)
+        tmp_path = f"{record_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"path": os.path.abspath(path), "size": stat.st_size,
+                       "mtime_ns": stat.st_mtime_ns, "sha256": digest}, f)
+        os.replace(tmp_path, record_path)
+
+    def verify(self, path: str, sha256: Optional[str]) -> bool:
+        if not sha256:
+            return True
+        return self.checksum(path) == sha256.lower()
+
+    # Fetching
+
+    def fetch(self, filename: str, url: str, sha256: Optional[str] = None,
+              existing: Optional[List[str]] = None) -> str:
+        """Local path of a verified copy of ``filename``, downloading it from ``url`` if needed.
+
+        ``existing`` lists other places the file may already be (e.g. an older cache layout).
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        candidates = list(existing or [])
+        if self.mirror and not self.mirror.startswith(("http://", "https://")):
+            candidates.insert(0, os.path.join(self.mirror, filename))
+        candidates.append(os.path.join(self.cache_dir, filename))
+
+        for candidate in candidates:
+            if os.path.isfile(candidate):
+                if self.verify(candidate, sha256):
+                    logger.info(f"✅ Using model file {candidate}")
+                    return candidate
+                logger.warning(f"⚠️ Checksum mismatch for {candidate}, ignoring it")
+
+        if self.mirror and self.mirror.startswith(("http://", "https://")):
+            url = f"{self.mirror.rstrip('/')}/{filename}"
+        return self.download(url, os.path.join(self.cache_dir, filename), sha256)
+
+    def _probe(self, url: str) -> Tuple[str, Optional[int], bool, Optional[str]]:
+        """Resolve redirects and return (final url, size, supports ranges, sha256 advertised by the origin)"""
+        # requests drops the Authorization header when a redirect leaves the host
+        response = self.session.head(url, headers=self._headers(url), allow_redirects=True, timeout=self.timeout)
+        response.raise_for_status()
+        sha256 = None
+        size = None
+        # Hugging Face reports the LFS object's sha256 and size on the redirect, not on the CDN response
+        for r in list(response.history) + [response]:
+            linked_etag = r.headers.get("X-Linked-Etag")
+            if linked_etag:
+                sha256 = linked_etag.strip('"').lower()
+            if r.headers.get("X-Linked-Size"):
+                size = int(r.headers["X-Linked-Size"])
+        if response.headers.get("Content-Length"):
+            size = int(response.headers["Content-Length"])
+        ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+        if sha256 and len(sha256) != 64:
+            sha256 = None
+        return response.url, size, ranges, sha256
+
+    def download(self, url: str, dest: str, sha256: Optional[str] = None) -> str:
+        final_url, size, ranges, advertised = self._probe(url)
+        sha256 = (sha256 or advertised or "").lower() or None
+        part_path = f"{dest}.part"
+        state_path = f"{dest}.part.json"
+        size_note = f" ({size / (1024 * 1024):.1f} MB)" if size else ""
+        logger.info(f"⬇️ Downloading {os.path.basename(dest)}{size_note} from {final_url.split('?')[0]}")
+        sys.stdout.flush()
+
+        if size and ranges:
+            self._download_ranged(final_url, part_path, state_path, size)
+        else:
+            self._download_stream(final_url, part_path, size)
+
+        digest = sha256_file(part_path)
+        if sha256 and digest != sha256:
+            os.remove(part_path)
+            if os.path.exists(state_path):
+                os.remove(state_path)
+            raise ChecksumMismatch(f"Downloaded {os.path.basename(dest)} does not match sha256 {sha256}")
+        os.replace(part_path, dest)
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        # Record the digest so the next startup does not hash the file again
+        self._record_checksum(dest, digest)
+        logger.info(f"✅ Download completed: {dest}")
+        return dest
+
+    def _load_state(self, state_path: str, size: int) -> Set[int]:
+        try:
+            with open(state_path) as f:
+                state = json.load(f)
+            if state["size"] == size and state["chunk_size"] == self.chunk_size:
+                return set(state["done"])
+        except (OSError, ValueError, KeyError):
+            pass
+        return set()
+
+    def _save_state(self, state_path: str, size: int, done: Set[int]):
+        tmp_path = f"{state_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"size": size, "chunk_size": self.chunk_size, "done": sorted(done)}, f)
+        os.replace(tmp_path, state_path)
+
+    def _download_ranged(self, url: str, part_path: str, state_path: str, size: int):
+        chunks = [(i, start, min(start + self.chunk_size, size) - 1)
+                  for i, start in enumerate(range(0, size, self.chunk_size))]
+        done = self._load_state(state_path, size) if os.path.exists(part_path) else set()
+        if not done:
+            with open(part_path, "wb") as f:
+                f.truncate(size)
+            self._save_state(state_path, size, done)
+        else:
+            logger.info(f"🔁 Resuming download, {len(done)}/{len(chunks)} chunks already present")
+
+        progress = DownloadProgress(
+            os.path.basename(part_path[:-5]), size,
+            downloaded=sum(end - start + 1 for i, start, end in chunks if i in done),
+            interval=self.progress_interval, callback=self.progress_callback
+        )
+        state_lock = threading.Lock()
+
+        def fetch_chunk(chunk: Tuple[int, int, int]):
+            index, start, end = chunk
+            for attempt in range(3):
+                written = 0
+                try:
+                    with self.session.get(url, headers=self._headers(url, Range=f"bytes={start}-{end}"), stream=True,
+                                          timeout=self.timeout) as response:
+                        if response.status_code != 206:
+                            raise IOError(f"Expected partial content, got HTTP {response.status_code}")
+                        with open(part_path, "r+b") as f:
+                            f.seek(start)
+                            for block in response.iter_content(1024 * 1024):
+                                f.write(block)
+                                written += len(block)
+                                progress.add(len(block))
+                    if written != end - start + 1:
+                        raise IOError(f"Short read for bytes {start}-{end}")
+                    with state_lock:
+                        done.add(index)
+                        self._save_state(state_path, size, done)
+                    return
+                except (requests.RequestException, IOError) as e:
+                    progress.add(-written)
+                    if attempt == 2:
+                        raise
+                    logger.warning(f"Retrying chunk {index} after error: {e}")
+                    time.sleep(2 ** attempt)
+
+        progress.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                list(pool.map(fetch_chunk, [c for c in chunks if c[0] not in done]))
+        finally:
+            progress.stop()
+        progress.log()
+
+    def _download_stream(self, url: str, part_path: str, size: Optional[int]):
+        """Single-connection fallback for servers without range support"""
+        progress = DownloadProgress(os.path.basename(part_path[:-5]), size or 0,
+                                    interval=self.progress_interval, callback=self.progress_callback)
+        progress.start()
+        try:
+            with self.session.get(url, headers=self._headers(url), stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                with open(part_path, "wb") as f:
+                    for block in response.iter_content(1024 * 1024):
+                        f.write(block)
+                        progress.add(len(block))
+        finally:
+            progress.stop()
+        progress.log()
+
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Any, Dict
 from enum import Enum
 
@@ -34,6 +34,7 @@ class QueryRequest(BaseModel):
     query: str
     context: Optional[List[str]] = []
     session_id: str
+    timeout: Optional[float] = Field(None, gt=0)  # Seconds before the query is cancelled, capped by QUERY_TIMEOUT
 
 class QueryResponse(BaseModel):
     sql: str
@@ -58,7 +59,9 @@ class SystemStats(BaseModel):
     processing: int
     completed: int
     failed: int
+    cancelled: int = 0
     queue_size: int
+    template_hit_rate: Optional[float] = None  # Only known when inference runs in this process
 
 class QueryStatusResponse(BaseModel):
     query_id: str
@@ -67,6 +70,7 @@ class QueryStatusResponse(BaseModel):
     error: Optional[str] = None
     created_at: str
     stats: Optional[SystemStats] = None
+    timings: Optional[Dict[str, float]] = None  # Per-stage seconds plus token counters
 
 class ContextLoadResponse(BaseModel):
     success: bool
@@ -1,11 +1,14 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Optional, Tuple
 import os
 import sys
 import time
-import threading
-from llama_cpp import Llama
-from huggingface_hub import hf_hub_download, HfFileSystem
 import logging
+from .metrics import StageTimer
+from .backends import ModelBackend, create_backend
+from .context_registry import ContextRegistry, schema_fingerprint
+from .sql_templates import SQLTemplateCache
+from .value_index import relevant_values
+from .cancellation import CancelToken
 
 # Configure logging
 logging.basicConfig(
@@ -15,171 +18,82 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-class DownloadTracker:
-    def __init__(self):
-        self.stop_tracking = False
-    
-    def track_download_progress(self, cache_dir, repo_id, total_size_mb):
-        """Track download progress by monitoring .incomplete file"""
-        def monitor():
-            count = 0
-            while not self.stop_tracking:
-                time.sleep(30)
-                count += 1
-                
-                # Find .incomplete file
-                incomplete_file = None
-                blob_dir = os.path.join(cache_dir, f"models--{repo_id.replace('/', '--')}", "blobs")
-                
-                if os.path.exists(blob_dir):
-                    for file in os.listdir(blob_dir):
-                        if file.endswith('.incomplete'):
-                            incomplete_file = os.path.join(blob_dir, file)
-                            break
-                
-                if incomplete_file and os.path.exists(incomplete_file):
-                    try:
-                        current_size_mb = os.path.getsize(incomplete_file) / (1024 * 1024)
-                        progress = (current_size_mb / total_size_mb) * 100
-                        logger.info(f"📥 Download progress: {progress:.1f}% ({current_size_mb:.1f}/{total_size_mb:.1f} MB)")
-                        sys.stdout.flush()
-                    except:
-                        logger.info(f"🔄 Download in progress... ({count * 30}s elapsed)")
-                        sys.stdout.flush()
-                else:
-                    # No incomplete file found, download might be complete
-                    if count > 1:  # Only log if we've been tracking for a while
-                        logger.info(f"🔄 Download in progress... ({count * 30}s elapsed)")
-                        sys.stdout.flush()
-        
-        thread = threading.Thread(target=monitor, daemon=True)
-        thread.start()
-        return thread
-    
-    def stop(self):
-        self.stop_tracking = True
-
 class NLPService:
-    def __init__(self):
-        self.model = None
-        self.download_tracker = None
-        self.context_loaded = False
-        self.loaded_schema = None
-        self._load_model()
+    def __init__(self, backend: Optional[ModelBackend] = None):
+        logger.info("🚀 Initializing NLP Service...")
+        self.backend = backend or create_backend()
+        self.contexts = ContextRegistry(
+            self.backend,
+            self._build_prompt_prefix,
+            max_entries=int(os.getenv("CONTEXT_CACHE_SIZE", "16")),
+            max_bytes=int(float(os.getenv("CONTEXT_CACHE_MAX_MB", "1024")) * 1024 * 1024)
+        )
+        self.templates = SQLTemplateCache(max_entries=int(os.getenv("SQL_TEMPLATE_CACHE_SIZE", "1024")))
+        self.value_hint_tokens = int(os.getenv("VALUE_HINT_TOKENS", "200"))
     
-    def _load_model(self):
-        try:
-            logger.info("🚀 Initializing NLP Service...")
-            
-            # Check if model already exists
-            cache_dir = "./models"
-            os.makedirs(cache_dir, exist_ok=True)
-            
-            repo_id = "mradermacher/natural-sql-7b-i1-GGUF"
-            filename = "natural-sql-7b.i1-Q4_K_M.gguf"
-            
-            logger.info(f"📥 Model: {repo_id}")
-            logger.info(f"📄 File: {filename}")
-            
-            # Get file size
-            try:
-                fs = HfFileSystem()
-                file_info = fs.info(f"{repo_id}/{filename}")
-                file_size_mb = file_info['size'] / (1024 * 1024)
-                logger.info(f"📊 Model size: {file_size_mb:.1f} MB")
-            except:
-                file_size_mb = 4000
-                logger.info("📊 Model size: ~4000 MB")
-            
-            # Check if model already exists locally
-            expected_path = os.path.join(cache_dir, f"models--{repo_id.replace('/', '--')}", "snapshots")
-            model_exists = False
-            
-            if os.path.exists(expected_path):
-                for snapshot_dir in os.listdir(expected_path):
-                    snapshot_path = os.path.join(expected_path, snapshot_dir, filename)
-                    if os.path.exists(snapshot_path):
-                        model_exists = True
-                        model_path = snapshot_path
-                        logger.info(f"✅ Model already downloaded: {model_path}")
-                        break
-            
-            if not model_exists:
-                logger.info("⬇️ Starting download (progress updates every 30s)...")
-                sys.stdout.flush()
-                
-                # Start progress tracking
-                self.download_tracker = DownloadTracker()
-                progress_thread = self.download_tracker.track_download_progress(cache_dir, repo_id, file_size_mb)
-                
-                # Download model
-                model_path = hf_hub_download(
-                    repo_id=repo_id,
-                    filename=filename,
-                    cache_dir=cache_dir,
-                    resume_download=True
-                )
-                
-                # Stop progress tracking
-                if self.download_tracker:
-                    self.download_tracker.stop()
-                
-                logger.info(f"✅ Download completed: {model_path}")
-            else:
-                logger.info("📁 Using existing model file")
-            logger.info("🔄 Loading model into memory...")
-            sys.stdout.flush()
-            
-            # Load model on CPU
-            logger.info("💻 Loading model on CPU...")
-            self.model = Llama(
-                model_path=model_path,
-                n_ctx=2048,
-                n_threads=4,
-                verbose=False
-            )
-            logger.info("💻 Model loaded on CPU")
-            
-            logger.info("🎉 Model loaded successfully!")
-            logger.info("✨ Ready to convert natural language to SQL queries")
-            sys.stdout.flush()
-            
-        except Exception as e:
-            logger.error(f"❌ Failed to load model: {e}")
-            logger.error("🚫 Model loading failed")
-            sys.stdout.flush()
-            self.model = None
-
-    def text_to_sql(self, text: str, schema: List[Dict], context: List[str] = None) -> str:
-        if not self.model:
-            raise Exception("Model not loaded. Cannot generate SQL without AI model.")
+    def text_to_sql(self, text: str, schema: List[Dict], context: List[str] = None, timer: Optional[StageTimer] = None,
+                    known_values: Optional[Iterable[str]] = None, cancel_token: Optional[CancelToken] = None,
+                    value_index: Optional[Dict] = None) -> str:
+        timer = timer or StageTimer()
+        fingerprint = schema_fingerprint(schema)
+        value_hints, matched_values = self.value_hints(text, value_index)
+        known_values = list(known_values or []) + matched_values
         
-        # Build schema context
-        schema_text = self._build_schema_context(schema)
+        # Questions that only differ in literals from an earlier one skip the model
+        with timer.stage("template_lookup"):
+            sql = self.templates.lookup(fingerprint, text, known_values)
+        if sql is not None:
+            timer.timings["template_hit"] = 1
+            return sql
         
-        # Create prompt for the model
-        prompt = f"""### Task
-Generate a SQL query for the following request.
-
-### Database Schema
-{schema_text}
-
-### Request
+        if not self.backend.is_ready():
+            raise Exception("Model not loaded. Cannot generate SQL without AI model.")
+        
+        with timer.stage("prompt_build"):
+            # Schema prefix (and its KV state) is built once per distinct schema
+            schema_context = self.contexts.get_or_build(schema, fingerprint)
+            
+            # Create prompt for the model; value hints depend on the question, so they stay out of the cached prefix
+            values_section = f"### Column Values\n{value_hints}\n\n" if value_hints else ""
+            suffix = f"""{values_section}### Request
 {text}
 
 ### SQL Query
 """
+            prompt = schema_context.prompt_prefix + suffix
+            prompt_tokens = len(schema_context.token_ids) + self.backend.count_tokens(suffix)
         
-        # Generate SQL using the model
-        response = self.model(
+        # Generate SQL using the model, streaming so we can see the first token arrive
+        start = time.perf_counter()
+        start_ns = time.time_ns()
+        first_token_at = None
+        pieces = []
+        stream = self.backend.stream(
             prompt,
             max_tokens=256,
             temperature=0.1,
             stop=["\n\n", "###"],
-            echo=False
+            kv_state=schema_context.kv_state,
+            should_stop=cancel_token.is_cancelled if cancel_token else None
         )
+        for piece in stream:
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            pieces.append(piece)
+        end = time.perf_counter()
         
-        sql = response['choices'][0]['text'].strip()
+        timer.record("generation", end - start, start_ns=start_ns)
+        for key, value in (self.backend.get_timings() or {}).items():
+            # Runtime-side split, e.g. llama.cpp prompt eval vs. eval milliseconds
+            if isinstance(value, (int, float)):
+                timer.timings[f"model_{key}"] = value
+        if cancel_token:
+            # A stopped stream leaves a truncated query; never hand it to the database
+            cancel_token.check()
+        ttft = (first_token_at or end) - start
+        timer.record_generation(prompt_tokens, len(pieces), ttft, end - (first_token_at or end))
+        
+        sql = "".join(pieces).strip()
         
         # Clean up the SQL
         if sql.startswith('```sql'):
@@ -189,6 +103,25 @@ Generate a SQL query for the following request.
 
         return sql.strip()
     
+    def value_hints(self, text: str, value_index: Optional[Dict]) -> Tuple[str, List[str]]:
+        """Stored values of the columns the question refers to, and those it names verbatim"""
+        return relevant_values(value_index, text, self.backend.count_tokens, self.value_hint_tokens)
+    
+    def remember_sql(self, text: str, schema: List[Dict], sql: str, known_values: Optional[Iterable[str]] = None) -> bool:
+        """Keep SQL that executed successfully as a template for similar questions"""
+        return self.templates.learn(schema_fingerprint(schema), text, sql, known_values)
+    
+    def _build_prompt_prefix(self, schema: List[Dict]) -> str:
+        """Question-independent start of the prompt, shared by every query on a schema"""
+        schema_text = self._build_schema_context(schema)
+        return f"""### Task
+Generate a SQL query for the following request.
+
+### Database Schema
+{schema_text}
+
+"""
+    
     def _build_schema_context(self, schema: List[Dict]) -> str:
         schema_lines = []
         for table in schema:
@@ -215,16 +148,17 @@ Generate a SQL query for the following request.
         return f"Generated SQL query for: '{original_query}'. The query retrieves data based on your natural language request."
     
     def load_context(self, schema: List[Dict]) -> bool:
-        """Load database schema context to the model"""
+        """Build (or reuse) the cached prompt context for a schema"""
         try:
-            self.loaded_schema = schema
-            self.context_loaded = True
-            logger.info(f"✅ Context loaded with {len(schema)} tables")
+            fingerprint = schema_fingerprint(schema)
+            cached = fingerprint in self.contexts
+            self.contexts.get_or_build(schema, fingerprint)
+            logger.info(f"✅ Context {'reused' if cached else 'loaded'} for {len(schema)} tables")
             return True
         except Exception as e:
             logger.error(f"❌ Failed to load context: {e}")
             return False
     
-    def is_context_loaded(self) -> bool:
-        """Check if context is loaded"""
-        return self.context_loaded
\ No newline at end of file
+    def is_context_loaded(self, schema: List[Dict]) -> bool:
+        """Check if a context for this schema is already cached"""
+        return schema_fingerprint(schema) in self.contexts
\ No newline at end of file
@@ -0,0 +1,195 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Optional
+from .state_store import StateStore
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ("off", "sample", "cprofile")
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval from a background thread.
+
+    Cheap enough to leave on for every job: the profiled thread is never
+    instrumented, and samples are only aggregated if the job turns out slow.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.01, max_depth: int = 64):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def report(self, top: int = 30) -> Dict:
+        """Hottest stacks in folded form plus per-function self and inclusive sample counts"""
+        own: Counter = Counter()
+        inclusive: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for function in {f.rsplit(":", 1)[0] for f in frames}:
+                inclusive[function] += count
+        return {
+            "type": "sample",
+            "interval": self.interval,
+            "samples": self.samples,
+            "self": [{"frame": f, "samples": c} for f, c in own.most_common(top)],
+            "inclusive": [{"function": f, "samples": c} for f, c in inclusive.most_common(top)],
+            "stacks": [{"stack": s, "samples": c} for s, c in self.stacks.most_common(top)],
+        }
+
+
+class _CProfileCapture:
+    """Deterministic profile of the calling thread; precise but slows Python-heavy stages down"""
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def report(self, top: int = 30) -> Dict:
+        out = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=out)
+        stats.sort_stats("cumulative").print_stats(top)
+        return {"type": "cprofile", "text": out.getvalue()}
+
+
+class SlowJobProfiler:
+    """Profiles every job cheaply and keeps the capture only for jobs slower than ``threshold`` seconds.
+
+    Captures (stack samples or cProfile output, stage timings, runtime timings
+    from the model backend and, if enabled, a tracemalloc snapshot) go to a bounded ring
+    buffer in the state store, so any API process can serve them.
+    """
+
+    def __init__(self, store: StateStore, threshold: float = 10.0, mode: str = "sample",
+                 sample_interval: float = 0.01, capacity: int = 50, tracemalloc_frames: int = 0):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{mode}'. Available: {', '.join(PROFILE_MODES)}")
+        self.store = store
+        self.threshold = threshold
+        self.mode = mode
+        self.sample_interval = sample_interval
+        self.capacity = capacity
+        self.tracemalloc_frames = tracemalloc_frames
+        # Tracing every allocation slows allocation-heavy stages several-fold, so it is opt-in
+        if self.enabled and tracemalloc_frames > 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(tracemalloc_frames)
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @contextmanager
+    def profile(self, job_id: str, details: Optional[Dict] = None):
+        """Profile the enclosed block, which must run on the thread doing the job's work.
+
+        ``details`` is read after the block, so callers can fill it in as the job progresses.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        capture = _CProfileCapture() if self.mode == "cprofile" else StackSampler(threading.get_ident(), self.sample_interval)
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        capture.start()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            capture.stop()
+            elapsed = time.perf_counter() - start
+            if elapsed >= self.threshold:
+                try:
+                    self._save(job_id, elapsed, capture, details or {}, error)
+                except Exception as e:
+                    logger.warning(f"Failed to store profile for job {job_id}: {e}")
+
+    def _memory_report(self, top: int = 20) -> Optional[Dict]:
+        if not tracemalloc.is_tracing():
+            return None
+        current, peak = tracemalloc.get_traced_memory()
+        statistics = tracemalloc.take_snapshot().statistics("lineno")[:top]
+        return {
+            "current_mb": round(current / (1024 * 1024), 2),
+            "peak_mb": round(peak / (1024 * 1024), 2),
+            "top": [
+                {"location": str(stat.traceback[0]), "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+                for stat in statistics
+            ],
+        }
+
+    def _save(self, job_id: str, elapsed: float, capture, details: Dict, error: Optional[str]):
+        profile = {
+            "id": str(uuid.uuid4()),
+            "job_id": job_id,
+            "created_at": time.time(),
+            "duration": round(elapsed, 3),
+            "threshold": self.threshold,
+            "error": error,
+            **details,
+            "profile": capture.report(),
+            "memory": self._memory_report(),
+        }
+        self.store.save_profile(profile, self.capacity)
+        logger.warning(f"🐢 Job {job_id} took {elapsed:.1f}s (threshold {self.threshold:.1f}s); profile {profile['id']} saved")
+
+
+def summarize_profile(profile: Dict) -> Dict:
+    """Listing entry for a stored profile, without the bulky capture"""
+    return {key: profile.get(key) for key in ("id", "job_id", "created_at", "duration", "query", "error", "timings")}
+
+
+def create_profiler(store: StateStore) -> SlowJobProfiler:
+    """Profiler configured from SLOW_JOB_THRESHOLD, PROFILE_MODE and related variables"""
+    return SlowJobProfiler(
+        store,
+        threshold=float(os.getenv("SLOW_JOB_THRESHOLD", "10")),
+        mode=os.getenv("PROFILE_MODE", "sample").lower(),
+        sample_interval=float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.01")),
+        capacity=int(os.getenv("PROFILE_CAPACITY", "50")),
+        tracemalloc_frames=int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "0"))
+    )
@@ -1,15 +1,29 @@
 import asyncio
+import os
+import socket
+import time
 import uuid
 from typing import Dict, Optional
 from enum import Enum
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
+from .state_store import StateStore, MemoryStateStore
+from .cancellation import CancelToken
+from .metrics import QUERIES_TOTAL
+
+# Seconds a query may take from submission before it is cancelled; matches the frontend's poll timeout
+DEFAULT_QUERY_TIMEOUT = float(os.getenv("QUERY_TIMEOUT", "300"))
+# Seconds a claimed query stays owned by its worker without a heartbeat before it is recovered
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "30"))
+# Times a query whose worker died is put back on the queue before it is failed
+JOB_MAX_RETRIES = int(os.getenv("JOB_MAX_RETRIES", "1"))
 
 class QueryStatus(Enum):
     QUEUED = "queued"
     PROCESSING = "processing"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
 
 @dataclass
 class QueuedQuery:
@@ -21,50 +35,214 @@ class QueuedQuery:
     created_at: datetime
     result: Optional[dict] = None
     error: Optional[str] = None
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+    deadline: Optional[datetime] = None
+    cancel_requested: bool = False
+    worker_id: Optional[str] = None
+    lease_expires: Optional[datetime] = None
+    retries: int = 0
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'session_id': self.session_id,
+            'query': self.query,
+            'context': self.context,
+            'status': self.status.value,
+            'created_at': self.created_at.timestamp(),
+            'result': self.result,
+            'error': self.error,
+            'started_at': self.started_at.timestamp() if self.started_at else None,
+            'completed_at': self.completed_at.timestamp() if self.completed_at else None,
+            'timings': self.timings,
+            'deadline': self.deadline.timestamp() if self.deadline else None,
+            'cancel_requested': self.cancel_requested,
+            'worker_id': self.worker_id,
+            'lease_expires': self.lease_expires.timestamp() if self.lease_expires else None,
+            'retries': self.retries
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QueuedQuery":
+        def to_datetime(value):
+            return datetime.fromtimestamp(value) if value is not None else None
+
+        return cls(
+            id=data['id'],
+            session_id=data['session_id'],
+            query=data['query'],
+            context=data.get('context') or [],
+            status=QueryStatus(data['status']),
+            created_at=to_datetime(data['created_at']),
+            result=data.get('result'),
+            error=data.get('error'),
+            started_at=to_datetime(data.get('started_at')),
+            completed_at=to_datetime(data.get('completed_at')),
+            timings=dict(data.get('timings') or {}),
+            deadline=to_datetime(data.get('deadline')),
+            cancel_requested=bool(data.get('cancel_requested')),
+            worker_id=data.get('worker_id'),
+            lease_expires=to_datetime(data.get('lease_expires')),
+            retries=int(data.get('retries') or 0)
+        )
 
 class QueryQueue:
-    def __init__(self):
-        self.queue = asyncio.Queue()
-        self.queries: Dict[str, QueuedQuery] = {}
-        self.processing = False
+    def __init__(self, store: Optional[StateStore] = None, poll_interval: float = 0.25,
+                 lease_seconds: float = JOB_LEASE_SECONDS, max_retries: int = JOB_MAX_RETRIES):
+        self.store = store or MemoryStateStore()
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_retries = max_retries
+        # Stamped on claimed jobs so a stale claim can be traced to its process
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.next_recovery = 0.0
+        # Wakes a processor in this process immediately; other processes poll the store
+        self.new_query = asyncio.Event()
+        # Tokens of queries running in this process, so local cancels skip the store round trip
+        self.cancel_tokens: Dict[str, CancelToken] = {}
     
-    async def add_query(self, session_id: str, query: str, context: list = None) -> str:
+    async def add_query(self, session_id: str, query: str, context: list = None, timeout: Optional[float] = None) -> str:
+        if timeout is not None and timeout <= 0:
+            raise ValueError("timeout must be positive")
         query_id = str(uuid.uuid4())
+        created_at = datetime.now()
+        timeout = DEFAULT_QUERY_TIMEOUT if timeout is None else min(timeout, DEFAULT_QUERY_TIMEOUT)
         queued_query = QueuedQuery(
             id=query_id,
             session_id=session_id,
             query=query,
             context=context or [],
             status=QueryStatus.QUEUED,
-            created_at=datetime.now()
+            created_at=created_at,
+            deadline=datetime.fromtimestamp(created_at.timestamp() + timeout)
         )
         
-        self.queries[query_id] = queued_query
-        await self.queue.put(query_id)
+        self.store.save_job(queued_query.to_dict())
+        self.new_query.set()
         return query_id
     
     def get_query_status(self, query_id: str) -> Optional[QueuedQuery]:
-        return self.queries.get(query_id)
+        data = self.store.load_job(query_id)
+        return QueuedQuery.from_dict(data) if data else None
+    
+    def _claim(self) -> Optional[str]:
+        """Claim the oldest queued query, dropping any whose deadline passed while waiting"""
+        if time.time() >= self.next_recovery:
+            self.next_recovery = time.time() + self.lease_seconds / 2
+            self.recover_stale_jobs()
+        while True:
+            query_id = self.store.claim_next_job(
+                {'worker_id': self.worker_id, 'lease_expires': time.time() + self.lease_seconds}
+            )
+            if not query_id:
+                return None
+            job = self.store.load_job(query_id)
+            if job and job.get('deadline') and job['deadline'] <= time.time():
+                self.update_query_status(query_id, QueryStatus.CANCELLED, error="Query deadline exceeded before processing started")
+                QUERIES_TOTAL.labels(status=QueryStatus.CANCELLED.value).inc()
+                continue
+            return query_id
     
     async def get_next_query(self) -> Optional[str]:
+        """Claim the oldest queued query; it is marked processing before being returned"""
+        query_id = self._claim()
+        if query_id:
+            return query_id
+        self.new_query.clear()
         try:
-            return await asyncio.wait_for(self.queue.get(), timeout=1.0)
+            await asyncio.wait_for(self.new_query.wait(), timeout=self.poll_interval)
         except asyncio.TimeoutError:
-            return None
+            pass
+        return self._claim()
+    
+    def renew_lease(self, query_id: str) -> bool:
+        """Heartbeat from the worker running a query; False once the query is no longer processing"""
+        return self.store.update_job(query_id, {'lease_expires': time.time() + self.lease_seconds},
+                                     expected_status=QueryStatus.PROCESSING.value)
+    
+    def recover_stale_jobs(self) -> int:
+        """Settle processing queries whose deadline passed or whose worker stopped renewing its lease.
+
+        Past the deadline, or with a cancel requested and nobody left to honour it,
+        the query is cancelled. Otherwise it is put back on the queue, up to
+        max_retries times, and then failed. Returns how many queries were settled.
+        """
+        now = time.time()
+        settled = 0
+        for job in self.store.list_jobs(QueryStatus.PROCESSING.value):
+            deadline_passed = bool(job.get('deadline')) and job['deadline'] <= now
+            # Jobs claimed before leases existed carry none; their started_at stands in
+            lease_expired = (job.get('lease_expires') or (job.get('started_at') or now) + self.lease_seconds) <= now
+            if not deadline_passed and not lease_expired:
+                continue
+            if deadline_passed or job.get('cancel_requested'):
+                status = QueryStatus.CANCELLED
+                error = "Query deadline exceeded" if deadline_passed else "Query cancelled by user"
+            elif job.get('retries', 0) < self.max_retries:
+                retry = {'retries': job.get('retries', 0) + 1, 'worker_id': None, 'lease_expires': None, 'started_at': None}
+                if self.store.requeue_job(job['id'], retry):
+                    settled += 1
+                    self.new_query.set()
+                continue
+            else:
+                status = QueryStatus.FAILED
+                error = "Worker stopped responding while processing the query"
+            fields = {'status': status.value, 'completed_at': now, 'error': error}
+            if self.store.update_job(job['id'], fields, expected_status=QueryStatus.PROCESSING.value):
+                QUERIES_TOTAL.labels(status=status.value).inc()
+                settled += 1
+        return settled
+    
+    def cancel_query(self, query_id: str, reason: str = "Query cancelled by user") -> Optional[QueryStatus]:
+        """Cancel a query. Queued queries are cancelled outright; running ones are flagged
+        for their worker to stop. Returns the resulting status, or None if not found."""
+        cancelled = {'status': QueryStatus.CANCELLED.value, 'completed_at': time.time(), 'error': reason}
+        if self.store.update_job(query_id, cancelled, expected_status=QueryStatus.QUEUED.value):
+            QUERIES_TOTAL.labels(status=QueryStatus.CANCELLED.value).inc()
+            return QueryStatus.CANCELLED
+        if self.store.update_job(query_id, {'cancel_requested': True}, expected_status=QueryStatus.PROCESSING.value):
+            token = self.cancel_tokens.get(query_id)
+            if token:
+                token.cancel(reason)
+            return QueryStatus.PROCESSING
+        queued_query = self.get_query_status(query_id)
+        return queued_query.status if queued_query else None
+    
+    def is_cancel_requested(self, query_id: str) -> bool:
+        job = self.store.load_job(query_id)
+        return bool(job and job.get('cancel_requested'))
+    
+    def update_query_status(self, query_id: str, status: QueryStatus, result: dict = None, error: str = None,
+                            timings: Dict[str, float] = None, expected_status: Optional[QueryStatus] = None) -> bool:
+        fields = {'status': status.value}
+        if status == QueryStatus.PROCESSING:
+            fields['started_at'] = time.time()
+        elif status in (QueryStatus.COMPLETED, QueryStatus.FAILED, QueryStatus.CANCELLED):
+            fields['completed_at'] = time.time()
+        if result:
+            fields['result'] = result
+        if error:
+            fields['error'] = error
+        if timings:
+            fields['timings'] = timings
+        return self.store.update_job(query_id, fields, expected_status=expected_status.value if expected_status else None)
+    
+    def save_result_payload(self, query_id: str, fmt: str, data: bytes):
+        self.store.save_payload(query_id, fmt, data)
+    
+    def get_result_payload(self, query_id: str, fmt: str) -> Optional[bytes]:
+        return self.store.load_payload(query_id, fmt)
+    
+    def status_counts(self) -> Dict[QueryStatus, int]:
+        counts = self.store.job_counts()
+        return {status: counts.get(status.value, 0) for status in QueryStatus}
     
-    def update_query_status(self, query_id: str, status: QueryStatus, result: dict = None, error: str = None):
-        if query_id in self.queries:
-            self.queries[query_id].status = status
-            if result:
-                self.queries[query_id].result = result
-            if error:
-                self.queries[query_id].error = error
+    def queue_size(self) -> int:
+        return self.store.queue_size()
     
     def cleanup_old_queries(self, max_age_hours: int = 24):
+        self.recover_stale_jobs()
         cutoff = datetime.now().timestamp() - (max_age_hours * 3600)
-        to_remove = [
-            qid for qid, query in self.queries.items()
-            if query.created_at.timestamp() < cutoff
-        ]
-        for qid in to_remove:
-            del self.queries[qid]
\ No newline at end of file
+        self.store.delete_jobs_before(cutoff)
@@ -0,0 +1,147 @@
+import base64
+import hashlib
+import io
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence
+import orjson
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow output is optional
+    pa = None
+
+# Response formats for query results, keyed by the name used in ?format=
+MEDIA_TYPES = {
+    "json": "application/json",
+    "columnar": "application/vnd.texttosql.columnar+json",
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+# Encoded when a query completes; the others are derived on first request and cached
+EAGER_FORMATS = ("json", "columnar")
+
+
+def available_formats() -> List[str]:
+    return [fmt for fmt in MEDIA_TYPES if fmt != "arrow" or pa is not None]
+
+
+def negotiate_format(requested: Optional[str], accept: Optional[str], default: str = "json") -> str:
+    """Pick a result format from an explicit ?format= value or the Accept header"""
+    formats = available_formats()
+    if requested:
+        if requested not in formats:
+            raise ValueError(f"Unsupported format '{requested}'. Available: {', '.join(formats)}")
+        return requested
+    for part in (accept or "").split(","):
+        media_type = part.split(";")[0].strip()
+        for fmt in formats:
+            if MEDIA_TYPES[fmt] == media_type:
+                return fmt
+    return default
+
+
+def _default(value: Any):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(value)).decode("ascii")
+    return str(value)
+
+
+def dumps(data: Any) -> bytes:
+    return orjson.dumps(data, default=_default)
+
+
+def result_metadata(result: Dict) -> Dict:
+    """Row-free part of a query result, kept on the job record"""
+    return {
+        "sql": result["sql"],
+        "columns": list(result["columns"]),
+        "row_count": len(result["rows"]),
+        "execution_time": result["execution_time"],
+        "explanation": result.get("explanation"),
+    }
+
+
+def result_etag(columnar_payload: bytes) -> str:
+    """Identity of a result, shared by all of its formats; derived from the columnar encoding"""
+    return hashlib.sha256(columnar_payload).hexdigest()[:32]
+
+
+def encode_json(result: Dict) -> bytes:
+    """Row-oriented JSON matching QueryResponse, as consumed by the frontend"""
+    columns = list(result["columns"])
+    return dumps({
+        "sql": result["sql"],
+        "results": [dict(zip(columns, row)) for row in result["rows"]],
+        "execution_time": result["execution_time"],
+        "explanation": result.get("explanation"),
+    })
+
+
+def encode_columnar(result: Dict) -> bytes:
+    columns = list(result["columns"])
+    data = [list(values) for values in zip(*result["rows"])] if result["rows"] else [[] for _ in columns]
+    return dumps({
+        "sql": result["sql"],
+        "columns": columns,
+        "data": data,
+        "row_count": len(result["rows"]),
+        "execution_time": result["execution_time"],
+        "explanation": result.get("explanation"),
+    })
+
+
+def encode_ndjson(result: Dict) -> bytes:
+    columns = list(result["columns"])
+    return b"".join(dumps(dict(zip(columns, row))) + b"\n" for row in result["rows"])
+
+
+def arrow_array(values: Sequence, type=None):
+    """Arrow array of ``values`` (inferred, or of ``type``), falling back to text when they do not convert"""
+    try:
+        return pa.array(values, type=type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # SQLite columns can mix types; fall back to text rather than failing the encoding
+        return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+
+
+def arrow_schema_metadata(result: Dict) -> Dict[bytes, bytes]:
+    return {
+        b"sql": result["sql"].encode("utf-8"),
+        b"execution_time": str(result.get("execution_time", "")).encode("utf-8"),
+        b"explanation": (result.get("explanation") or "").encode("utf-8"),
+    }
+
+
+def encode_arrow(result: Dict) -> bytes:
+    if pa is None:
+        raise ValueError("Arrow output requires pyarrow")
+    columns = list(result["columns"])
+    values = list(zip(*result["rows"])) if result["rows"] else [() for _ in columns]
+    table = pa.Table.from_arrays([arrow_array(list(v)) for v in values], names=columns)
+    table = table.replace_schema_metadata(arrow_schema_metadata(result))
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+ENCODERS = {
+    "json": encode_json,
+    "columnar": encode_columnar,
+    "ndjson": encode_ndjson,
+    "arrow": encode_arrow,
+}
+
+
+def encode_result(result: Dict, fmt: str) -> bytes:
+    """Encode a result with ``columns`` and ``rows`` in the given format"""
+    return ENCODERS[fmt](result)
+
+
+def decode_columnar(payload: bytes) -> Dict:
+    """Rebuild a columns/rows result from its columnar payload"""
+    data = orjson.loads(payload)
+    data["rows"] = list(zip(*data.pop("data"))) if data["row_count"] else []
+    return data
@@ -1,53 +1,219 @@
+import heapq
+import os
 import uuid
 import time
-from typing import Dict, Optional
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
 from .database import DatabaseManager
+from .state_store import StateStore, MemoryStateStore
+from .context_registry import schema_fingerprint
+from .value_index import ValueIndexer, create_value_indexer
+from .credentials import ConnectionSealer, create_sealer
+
+logger = logging.getLogger(__name__)
 
 class SessionManager:
-    def __init__(self, session_timeout: int = 3600):  # 1 hour timeout
+    """Sessions live in the shared state store; each process keeps its own engines for the sessions it serves.
+
+    Engines idle for longer than ``idle_timeout`` hibernate: their connection pool
+    is closed and reopened lazily on next use, while the cached schema stays in
+    the store. Idle deadlines sit in a min-heap, so cleanup only touches sessions
+    that are actually due.
+    """
+
+    def __init__(self, session_timeout: int = 3600, store: Optional[StateStore] = None,
+                 idle_timeout: Optional[int] = None, value_indexer: Optional[ValueIndexer] = None,
+                 sealer: Optional[ConnectionSealer] = None):  # 1 hour timeout
+        self.store = store or MemoryStateStore()
+        self.sealer = sealer or create_sealer()
+        self.value_indexer = value_indexer or create_value_indexer(self.store)
         self.sessions: Dict[str, Dict] = {}
         self.session_timeout = session_timeout
+        self.idle_timeout = idle_timeout if idle_timeout is not None else int(os.getenv("SESSION_IDLE_TIMEOUT", "120"))
+        # (idle deadline, session id); an entry is rescheduled rather than duplicated when a session is used
+        self.idle_heap: List[Tuple[float, str]] = []
+        self.lock = threading.Lock()
+    
+    def _track_local(self, session_id: str, db_manager: DatabaseManager) -> Dict:
+        now = time.time()
+        local = {'db_manager': db_manager, 'last_used': now, 'scheduled': True}
+        with self.lock:
+            self.sessions[session_id] = local
+            heapq.heappush(self.idle_heap, (now + self.idle_timeout, session_id))
+        return local
+    
+    def _mark_used(self, local: Dict, session_id: str):
+        now = time.time()
+        with self.lock:
+            local['last_used'] = now
+            if not local['scheduled']:
+                # Hibernated sessions left the heap; the engine reconnects on its next query
+                local['scheduled'] = True
+                heapq.heappush(self.idle_heap, (now + self.idle_timeout, session_id))
     
     def create_session(self) -> str:
         session_id = str(uuid.uuid4())
-        self.sessions[session_id] = {
-            'db_manager': DatabaseManager(),
-            'created_at': time.time(),
-            'last_accessed': time.time()
-        }
+        now = time.time()
+        self.store.save_session(session_id, {
+            'connection': None,
+            'context_loaded': False,
+            'created_at': now,
+            'last_accessed': now
+        })
+        self._track_local(session_id, DatabaseManager())
         return session_id
     
+    def save_connection(self, session_id: str):
+        """Persist the session's connection parameters, encrypted or without secrets, so other processes can reconnect"""
+        session = self.store.load_session(session_id)
+        local = self.sessions.get(session_id)
+        if session is None or local is None:
+            return
+        session['connection'] = self.sealer.seal(local['db_manager'].connection_params)
+        self.store.save_session(session_id, session)
+    
     def get_session(self, session_id: str) -> Optional[DatabaseManager]:
-        if session_id not in self.sessions:
+        session = self.store.load_session(session_id)
+        if session is None:
+            self._release_local(session_id)
             return None
         
-        session = self.sessions[session_id]
-        
         # Check if session expired
         if time.time() - session['last_accessed'] > self.session_timeout:
             self.cleanup_session(session_id)
             return None
         
         # Update last accessed time
-        session['last_accessed'] = time.time()
-        return session['db_manager']
+        self.store.touch_session(session_id, time.time())
+        
+        local = self.sessions.get(session_id)
+        if local is None:
+            # Session was created by another process; connect from its saved parameters
+            db_manager = DatabaseManager()
+            params = self.sealer.unseal(session.get('connection'))
+            if session.get('connection') and params is None:
+                logger.error(f"Session {session_id[:8]} cannot reconnect here: its credentials are not in the store")
+            if params:
+                try:
+                    db_manager.connect_params(params)
+                except Exception as e:
+                    logger.error(f"Failed to reconnect session {session_id[:8]}: {e}")
+            local = self._track_local(session_id, db_manager)
+        else:
+            self._mark_used(local, session_id)
+        return local['db_manager']
+    
+    def get_schema(self, session_id: str, refresh: bool = False) -> Optional[List[Dict]]:
+        """Schema snapshot for the session, reflected once and shared through the store"""
+        if not refresh:
+            schema = self.store.load_schema(session_id)
+            if schema is not None:
+                return schema
+        db_manager = self.get_session(session_id)
+        if not db_manager or not db_manager.is_connected():
+            return None
+        schema = [table.dict() for table in db_manager.get_schema()]
+        self.store.save_schema(session_id, schema)
+        session = self.store.load_session(session_id)
+        if session is not None:
+            session['schema_fingerprint'] = schema_fingerprint(schema)
+            self.store.save_session(session_id, session)
+        return schema
+    
+    def get_schema_fingerprint(self, session_id: str) -> Optional[str]:
+        """Fingerprint of the session's stored schema snapshot, without loading the snapshot"""
+        session = self.store.load_session(session_id)
+        return session.get('schema_fingerprint') if session else None
+    
+    def get_value_index(self, session_id: str) -> Optional[Dict]:
+        """Column statistics for the session's current schema; a store read only, never a database query"""
+        if self.value_indexer is None:
+            return None
+        return self.value_indexer.load(session_id, self.get_schema_fingerprint(session_id))
+    
+    def build_value_indexes(self) -> int:
+        """Profile the next columns of each local session with a schema snapshot; returns columns profiled"""
+        if self.value_indexer is None:
+            return 0
+        with self.lock:
+            # Hibernated sessions are left alone so profiling does not reopen their pools
+            candidates = [(sid, local['db_manager']) for sid, local in self.sessions.items() if local['scheduled']]
+        profiled = 0
+        for session_id, db_manager in candidates:
+            if not db_manager.is_connected():
+                continue
+            fingerprint = self.get_schema_fingerprint(session_id)
+            schema = self.store.load_schema(session_id) if fingerprint else None
+            if schema is None:
+                continue
+            try:
+                profiled += self.value_indexer.step(session_id, db_manager, schema, fingerprint)
+            except Exception as e:
+                logger.error(f"Value index failed for session {session_id[:8]}: {e}")
+        return profiled
+    
+    def set_context_loaded(self, session_id: str, loaded: bool = True):
+        session = self.store.load_session(session_id)
+        if session is not None:
+            session['context_loaded'] = loaded
+            self.store.save_session(session_id, session)
+    
+    def is_context_loaded(self, session_id: str) -> bool:
+        session = self.store.load_session(session_id)
+        return bool(session and session.get('context_loaded'))
+    
+    def _release_local(self, session_id: str):
+        # Any heap entry left behind is skipped when it comes due
+        with self.lock:
+            local = self.sessions.pop(session_id, None)
+        if local and local['db_manager'].is_connected():
+            local['db_manager'].disconnect()
     
     def cleanup_session(self, session_id: str):
-        if session_id in self.sessions:
-            # Disconnect database if connected
-            db_manager = self.sessions[session_id]['db_manager']
-            if db_manager.is_connected():
-                db_manager.disconnect()
-            del self.sessions[session_id]
-    
-    def cleanup_expired_sessions(self):
-        current_time = time.time()
-        expired_sessions = [
-            sid for sid, session in self.sessions.items()
-            if current_time - session['last_accessed'] > self.session_timeout
-        ]
-        for session_id in expired_sessions:
+        self._release_local(session_id)
+        self.store.delete_session(session_id)
+        self.store.delete_schema(session_id)
+        self.store.delete_value_index(session_id)
+    
+    def _due_idle_sessions(self, now: float) -> List[str]:
+        """Pop sessions whose idle deadline passed, rescheduling those used since they were pushed"""
+        due = []
+        with self.lock:
+            while self.idle_heap and self.idle_heap[0][0] <= now:
+                _, session_id = heapq.heappop(self.idle_heap)
+                local = self.sessions.get(session_id)
+                if local is None:
+                    continue
+                deadline = local['last_used'] + self.idle_timeout
+                if deadline > now:
+                    heapq.heappush(self.idle_heap, (deadline, session_id))
+                else:
+                    local['scheduled'] = False
+                    due.append(session_id)
+        return due
+    
+    def cleanup_expired_sessions(self) -> Dict[str, int]:
+        """Expire timed-out sessions and hibernate idle engines; cost scales with the sessions that are due"""
+        now = time.time()
+        expired = self.store.expired_sessions(now - self.session_timeout)
+        for session_id in expired:
             self.cleanup_session(session_id)
+        
+        hibernated = 0
+        for session_id in self._due_idle_sessions(now):
+            local = self.sessions.get(session_id)
+            if local is None:
+                continue
+            if self.store.load_session(session_id) is None:
+                # Removed by another process
+                self._release_local(session_id)
+            elif local['db_manager'].is_connected():
+                local['db_manager'].hibernate()
+                hibernated += 1
+        if expired or hibernated:
+            logger.info(f"Expired {len(expired)} sessions, hibernated {hibernated} idle connections")
+        return {"expired": len(expired), "hibernated": hibernated}
     
     def get_session_count(self) -> int:
-        return len(self.sessions)
\ No newline at end of file
+        return self.store.count_sessions()
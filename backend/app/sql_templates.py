@@ -0,0 +1,159 @@
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+from .metrics import SQL_TEMPLATE_EVENTS
+
+# Literal kinds pulled out of questions, most specific first
+_LITERAL_PATTERNS = [
+    ("str", re.compile(r"'([^']+)'|\"([^\"]+)\"")),
+    ("date", re.compile(r"(?<![\w-])(\d{4}-\d{2}-\d{2})(?![\w-])")),
+    ("num", re.compile(r"(?<![\w.])(\d+(?:\.\d+)?)(?![\w.])")),
+]
+# Standalone years, also as the start of a date constant such as '2023-01-01'
+_YEAR_RE = re.compile(r"(?<![\w.])(?:19|20)\d{2}(?![\w.])")
+_MARKER = "\x00{}\x00"
+_MARKER_RE = re.compile(r"\x00(\d+)\x00")
+
+
+@dataclass
+class Literal:
+    kind: str
+    value: str
+
+
+@dataclass
+class SQLTemplate:
+    shape: str
+    kinds: List[str]
+    sql: str  # SQL with \x00i\x00 markers where literal i is bound
+
+
+def _sql_pattern(literal: Literal) -> re.Pattern:
+    """Where a literal may appear in generated SQL: bare numbers, or inside string literals"""
+    if literal.kind == "num":
+        return re.compile(rf"(?<![\w.]){re.escape(literal.value)}(?![\w.])")
+    if literal.kind == "date":
+        return re.compile(rf"(?<=['%]){re.escape(literal.value)}")
+    escaped = re.escape(literal.value.replace("'", "''"))
+    return re.compile(rf"(?<=['%]){escaped}(?=['%])", re.IGNORECASE)
+
+
+def extract_literals(question: str, known_values: Optional[Iterable[str]] = None) -> Tuple[str, List[Literal]]:
+    """Split a question into its shape (literals replaced by <kind>) and the literals in order"""
+    spans = []
+    for kind, pattern in _LITERAL_PATTERNS:
+        for match in pattern.finditer(question):
+            group = next(i for i in range(1, (match.lastindex or 0) + 1) if match.group(i) is not None)
+            spans.append((match.start(), match.end(), kind, match.group(group)))
+    for value in known_values or ():
+        for match in re.finditer(rf"(?<!\w){re.escape(value)}(?!\w)", question, re.IGNORECASE):
+            spans.append((match.start(), match.end(), "str", match.group(0)))
+
+    # Keep the earliest, longest non-overlapping spans
+    spans.sort(key=lambda s: (s[0], -(s[1] - s[0])))
+    shape_parts, literals, position = [], [], 0
+    for start, end, kind, value in spans:
+        if start < position:
+            continue
+        shape_parts.append(question[position:start])
+        shape_parts.append(f"<{kind}>")
+        literals.append(Literal(kind, value))
+        position = end
+    shape_parts.append(question[position:])
+    shape = re.sub(r"\s+", " ", "".join(shape_parts)).strip().lower()
+    return shape, literals
+
+
+def _is_year(literal: Literal) -> bool:
+    return literal.kind == "num" and _YEAR_RE.fullmatch(literal.value) is not None
+
+
+def build_template(shape: str, literals: List[Literal], sql: str) -> Optional[SQLTemplate]:
+    """Parameterize generated SQL by the question's literals; None when the mapping is ambiguous.
+
+    Every literal must appear exactly once in the SQL: a second occurrence may be
+    a coincidence (``LIMIT 100``, ``GROUP BY 1``) that must not be rebound. A year
+    is also rejected when the SQL holds other year or date constants, since those
+    are usually derived from it (``< '2024-01-01'``) and would go stale.
+    """
+    values = [lit.value.lower() for lit in literals]
+    if len(set(values)) != len(values):
+        return None
+
+    templated = sql
+    # Longest literals first so "2023-01-01" is not split by a "2023" literal
+    for index in sorted(range(len(literals)), key=lambda i: -len(literals[i].value)):
+        literal = literals[index]
+        templated, count = _sql_pattern(literal).subn(_MARKER.format(index), templated)
+        if count != 1:
+            # Missing means the model did not use it verbatim; repeated means some uses may be unrelated
+            return None
+        if _is_year(literal) and _YEAR_RE.search(_MARKER_RE.sub("", templated)):
+            return None
+    return SQLTemplate(shape=shape, kinds=[lit.kind for lit in literals], sql=templated)
+
+
+def bind_template(template: SQLTemplate, literals: List[Literal]) -> str:
+    def replace(match: re.Match) -> str:
+        literal = literals[int(match.group(1))]
+        return literal.value.replace("'", "''") if literal.kind == "str" else literal.value
+    return _MARKER_RE.sub(replace, template.sql)
+
+
+class SQLTemplateCache:
+    """Generated SQL cached as parameterized templates per (schema fingerprint, question shape).
+
+    Questions that differ only in numbers, dates, quoted strings or known
+    column values reuse an earlier generation with the new literals bound,
+    skipping the model entirely.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.templates: "OrderedDict[Tuple[str, str], SQLTemplate]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, fingerprint: str, question: str, known_values: Optional[Iterable[str]] = None) -> Optional[str]:
+        shape, literals = extract_literals(question, known_values)
+        with self.lock:
+            template = self.templates.get((fingerprint, shape))
+            if template is not None and template.kinds == [lit.kind for lit in literals]:
+                self.templates.move_to_end((fingerprint, shape))
+                self.hits += 1
+                SQL_TEMPLATE_EVENTS.labels(event="hit").inc()
+                return bind_template(template, literals)
+            self.misses += 1
+        SQL_TEMPLATE_EVENTS.labels(event="miss").inc()
+        return None
+
+    def learn(self, fingerprint: str, question: str, sql: str, known_values: Optional[Iterable[str]] = None) -> bool:
+        """Remember SQL that executed successfully for a question"""
+        shape, literals = extract_literals(question, known_values)
+        template = build_template(shape, literals, sql)
+        if template is None:
+            SQL_TEMPLATE_EVENTS.labels(event="rejected").inc()
+            return False
+        with self.lock:
+            self.templates[(fingerprint, shape)] = template
+            self.templates.move_to_end((fingerprint, shape))
+            while len(self.templates) > self.max_entries:
+                self.templates.popitem(last=False)
+        SQL_TEMPLATE_EVENTS.labels(event="learned").inc()
+        return True
+
+    def clear(self):
+        with self.lock:
+            self.templates.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def hit_rate(self) -> Optional[float]:
+        total = self.hits + self.misses
+        return round(self.hits / total, 4) if total else None
+
+    def stats(self) -> Dict[str, float]:
+        return {"templates": len(self.templates), "hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate()}
@@ -0,0 +1,570 @@
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+# Job statuses are plain strings here so the store does not depend on the queue module
+QUEUED = "queued"
+PROCESSING = "processing"
+CANCELLED = "cancelled"
+JOB_STATUSES = (QUEUED, PROCESSING, "completed", "failed", CANCELLED)
+
+
+def _dumps(data) -> str:
+    # Query results may contain Decimal, datetime or bytes values from the database driver
+    return json.dumps(data, default=str)
+
+
+class StateStore:
+    """Session metadata, job state and schema snapshots shared by API processes and inference workers.
+
+    Jobs are plain dicts with at least ``id``, ``status`` and ``created_at``
+    (epoch seconds). Sessions are dicts with a ``last_accessed`` timestamp.
+    """
+
+    # Sessions
+    def save_session(self, session_id: str, data: Dict):
+        raise NotImplementedError
+
+    def load_session(self, session_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def touch_session(self, session_id: str, timestamp: float):
+        raise NotImplementedError
+
+    def delete_session(self, session_id: str):
+        raise NotImplementedError
+
+    def expired_sessions(self, cutoff: float) -> List[str]:
+        """Ids of sessions last accessed before cutoff"""
+        raise NotImplementedError
+
+    def count_sessions(self) -> int:
+        raise NotImplementedError
+
+    # Jobs
+    def save_job(self, job: Dict):
+        """Store a new job and make it available to claim_next_job"""
+        raise NotImplementedError
+
+    def load_job(self, job_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def update_job(self, job_id: str, fields: Dict, expected_status: Optional[str] = None) -> bool:
+        """Apply fields to a job; with expected_status, only if the job is still in that status.
+
+        Returns whether the job was updated, so callers can race safely (e.g. cancel vs claim).
+        """
+        raise NotImplementedError
+
+    def claim_next_job(self, fields: Optional[Dict] = None) -> Optional[str]:
+        """Atomically move the oldest queued job to processing and return its id.
+
+        ``fields`` (e.g. the claiming worker and its lease) are applied in the same step.
+        """
+        raise NotImplementedError
+
+    def requeue_job(self, job_id: str, fields: Optional[Dict] = None) -> bool:
+        """Put a processing job back at the front of the queue; False if it is no longer processing"""
+        raise NotImplementedError
+
+    def list_jobs(self, status: str) -> List[Dict]:
+        """Jobs currently in a status"""
+        raise NotImplementedError
+
+    def job_counts(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+    def delete_jobs_before(self, cutoff: float):
+        """Delete old jobs together with their result payloads"""
+        raise NotImplementedError
+
+    def save_payload(self, job_id: str, fmt: str, data: bytes):
+        """Store an encoded result body for a job"""
+        raise NotImplementedError
+
+    def load_payload(self, job_id: str, fmt: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    # Schema snapshots
+    def save_schema(self, key: str, schema: List[Dict]):
+        raise NotImplementedError
+
+    def load_schema(self, key: str) -> Optional[List[Dict]]:
+        raise NotImplementedError
+
+    def delete_schema(self, key: str):
+        raise NotImplementedError
+
+    # Column statistics, kept next to the schema snapshot they describe
+    def save_value_index(self, key: str, index: Dict):
+        self.save_schema(f"{key}:values", index)
+
+    def load_value_index(self, key: str) -> Optional[Dict]:
+        return self.load_schema(f"{key}:values")
+
+    def delete_value_index(self, key: str):
+        self.delete_schema(f"{key}:values")
+
+    # Slow-job profiles, a ring buffer of the most recent entries
+    def save_profile(self, profile: Dict, capacity: int):
+        """Store a profile (a dict with ``id`` and ``created_at``), dropping the oldest beyond capacity"""
+        raise NotImplementedError
+
+    def list_profiles(self) -> List[Dict]:
+        """Stored profiles, newest first"""
+        raise NotImplementedError
+
+    def load_profile(self, profile_id: str) -> Optional[Dict]:
+        return next((p for p in self.list_profiles() if p['id'] == profile_id), None)
+
+    def queue_size(self) -> int:
+        return self.job_counts().get(QUEUED, 0)
+
+
+class MemoryStateStore(StateStore):
+    """Process-local store; the default for a single API process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions: Dict[str, Dict] = {}
+        # (last_accessed when scheduled, session id), one entry per session; touches reschedule lazily
+        self.session_heap: List = []
+        self.jobs: Dict[str, Dict] = {}
+        self.pending = deque()
+        self.payloads: Dict[str, Dict[str, bytes]] = {}
+        self.schemas: Dict[str, List[Dict]] = {}
+        self.profiles = deque()
+
+    def save_session(self, session_id: str, data: Dict):
+        with self.lock:
+            if session_id not in self.sessions:
+                heapq.heappush(self.session_heap, (data['last_accessed'], session_id))
+            self.sessions[session_id] = dict(data)
+
+    def load_session(self, session_id: str) -> Optional[Dict]:
+        session = self.sessions.get(session_id)
+        return dict(session) if session else None
+
+    def touch_session(self, session_id: str, timestamp: float):
+        with self.lock:
+            if session_id in self.sessions:
+                self.sessions[session_id]['last_accessed'] = timestamp
+
+    def delete_session(self, session_id: str):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+
+    def expired_sessions(self, cutoff: float) -> List[str]:
+        expired, reschedule = [], []
+        with self.lock:
+            while self.session_heap and self.session_heap[0][0] < cutoff:
+                _, session_id = heapq.heappop(self.session_heap)
+                session = self.sessions.get(session_id)
+                if session is None:
+                    continue
+                if session['last_accessed'] < cutoff:
+                    expired.append(session_id)
+                # Sessions touched since being scheduled go back in at their current time;
+                # expired ones stay scheduled until the caller deletes them
+                reschedule.append((session['last_accessed'], session_id))
+            for entry in reschedule:
+                heapq.heappush(self.session_heap, entry)
+        return expired
+
+    def count_sessions(self) -> int:
+        return len(self.sessions)
+
+    def save_job(self, job: Dict):
+        with self.lock:
+            self.jobs[job['id']] = dict(job)
+            self.pending.append(job['id'])
+
+    def load_job(self, job_id: str) -> Optional[Dict]:
+        job = self.jobs.get(job_id)
+        return dict(job) if job else None
+
+    def update_job(self, job_id: str, fields: Dict, expected_status: Optional[str] = None) -> bool:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or (expected_status is not None and job['status'] != expected_status):
+                return False
+            job.update(fields)
+            return True
+
+    def claim_next_job(self, fields: Optional[Dict] = None) -> Optional[str]:
+        with self.lock:
+            while self.pending:
+                job_id = self.pending.popleft()
+                job = self.jobs.get(job_id)
+                if job and job['status'] == QUEUED:
+                    job.update(fields or {}, status=PROCESSING, started_at=time.time())
+                    return job_id
+            return None
+
+    def requeue_job(self, job_id: str, fields: Optional[Dict] = None) -> bool:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job['status'] != PROCESSING:
+                return False
+            job.update(fields or {}, status=QUEUED)
+            self.pending.appendleft(job_id)
+            return True
+
+    def list_jobs(self, status: str) -> List[Dict]:
+        return [dict(job) for job in list(self.jobs.values()) if job['status'] == status]
+
+    def job_counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for job in list(self.jobs.values()):
+            counts[job['status']] = counts.get(job['status'], 0) + 1
+        return counts
+
+    def delete_jobs_before(self, cutoff: float):
+        with self.lock:
+            for job_id in [jid for jid, job in self.jobs.items() if job['created_at'] < cutoff]:
+                del self.jobs[job_id]
+                self.payloads.pop(job_id, None)
+
+    def save_payload(self, job_id: str, fmt: str, data: bytes):
+        with self.lock:
+            self.payloads.setdefault(job_id, {})[fmt] = data
+
+    def load_payload(self, job_id: str, fmt: str) -> Optional[bytes]:
+        return self.payloads.get(job_id, {}).get(fmt)
+
+    def save_schema(self, key: str, schema: List[Dict]):
+        self.schemas[key] = schema
+
+    def load_schema(self, key: str) -> Optional[List[Dict]]:
+        return self.schemas.get(key)
+
+    def delete_schema(self, key: str):
+        self.schemas.pop(key, None)
+
+    def save_profile(self, profile: Dict, capacity: int):
+        with self.lock:
+            self.profiles.appendleft(profile)
+            while len(self.profiles) > capacity:
+                self.profiles.pop()
+
+    def list_profiles(self) -> List[Dict]:
+        return list(self.profiles)
+
+
+class SQLiteStateStore(StateStore):
+    """Store backed by a SQLite file, shared by the processes of a single host.
+
+    WAL mode relies on shared memory between processes, so the file must sit on a
+    local disk; network filesystems are not supported. Use Redis across nodes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, last_accessed REAL NOT NULL, data TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS idx_sessions_last_accessed ON sessions(last_accessed);
+            CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, created_at REAL NOT NULL, data TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs(status, created_at);
+            CREATE TABLE IF NOT EXISTS payloads (job_id TEXT NOT NULL, format TEXT NOT NULL, data BLOB NOT NULL, PRIMARY KEY (job_id, format));
+            CREATE TABLE IF NOT EXISTS schemas (key TEXT PRIMARY KEY, data TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS profiles (id TEXT PRIMARY KEY, created_at REAL NOT NULL, data TEXT NOT NULL);
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self.local.conn = conn
+        return conn
+
+    def save_session(self, session_id: str, data: Dict):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO sessions (id, last_accessed, data) VALUES (?, ?, ?)",
+            (session_id, data['last_accessed'], _dumps(data))
+        )
+
+    def load_session(self, session_id: str) -> Optional[Dict]:
+        row = self._conn().execute("SELECT last_accessed, data FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if not row:
+            return None
+        session = json.loads(row[1])
+        session['last_accessed'] = row[0]
+        return session
+
+    def touch_session(self, session_id: str, timestamp: float):
+        self._conn().execute("UPDATE sessions SET last_accessed = ? WHERE id = ?", (timestamp, session_id))
+
+    def delete_session(self, session_id: str):
+        self._conn().execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def expired_sessions(self, cutoff: float) -> List[str]:
+        return [row[0] for row in self._conn().execute("SELECT id FROM sessions WHERE last_accessed < ?", (cutoff,))]
+
+    def count_sessions(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def save_job(self, job: Dict):
+        self._conn().execute(
+            "INSERT INTO jobs (id, status, created_at, data) VALUES (?, ?, ?, ?)",
+            (job['id'], job['status'], job['created_at'], _dumps(job))
+        )
+
+    def load_job(self, job_id: str) -> Optional[Dict]:
+        row = self._conn().execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update_job(self, job_id: str, fields: Dict, expected_status: Optional[str] = None) -> bool:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            updated = False
+            if row:
+                job = json.loads(row[0])
+                if expected_status is None or job['status'] == expected_status:
+                    job.update(fields)
+                    conn.execute("UPDATE jobs SET status = ?, data = ? WHERE id = ?", (job['status'], _dumps(job), job_id))
+                    updated = True
+            conn.execute("COMMIT")
+            return updated
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def claim_next_job(self, fields: Optional[Dict] = None) -> Optional[str]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, data FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if not row:
+                conn.execute("COMMIT")
+                return None
+            job = json.loads(row[1])
+            job.update(fields or {}, status=PROCESSING, started_at=time.time())
+            conn.execute("UPDATE jobs SET status = ?, data = ? WHERE id = ?", (PROCESSING, _dumps(job), row[0]))
+            conn.execute("COMMIT")
+            return row[0]
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def requeue_job(self, job_id: str, fields: Optional[Dict] = None) -> bool:
+        # Claims take the oldest queued job by created_at, so a requeued job goes first without reordering
+        return self.update_job(job_id, dict(fields or {}, status=QUEUED), expected_status=PROCESSING)
+
+    def list_jobs(self, status: str) -> List[Dict]:
+        rows = self._conn().execute("SELECT data FROM jobs WHERE status = ?", (status,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def job_counts(self) -> Dict[str, int]:
+        return dict(self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def delete_jobs_before(self, cutoff: float):
+        conn = self._conn()
+        conn.execute("DELETE FROM payloads WHERE job_id IN (SELECT id FROM jobs WHERE created_at < ?)", (cutoff,))
+        conn.execute("DELETE FROM jobs WHERE created_at < ?", (cutoff,))
+
+    def save_payload(self, job_id: str, fmt: str, data: bytes):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO payloads (job_id, format, data) VALUES (?, ?, ?)", (job_id, fmt, data)
+        )
+
+    def load_payload(self, job_id: str, fmt: str) -> Optional[bytes]:
+        row = self._conn().execute(
+            "SELECT data FROM payloads WHERE job_id = ? AND format = ?", (job_id, fmt)
+        ).fetchone()
+        return bytes(row[0]) if row else None
+
+    def save_schema(self, key: str, schema: List[Dict]):
+        self._conn().execute("INSERT OR REPLACE INTO schemas (key, data) VALUES (?, ?)", (key, _dumps(schema)))
+
+    def load_schema(self, key: str) -> Optional[List[Dict]]:
+        row = self._conn().execute("SELECT data FROM schemas WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete_schema(self, key: str):
+        self._conn().execute("DELETE FROM schemas WHERE key = ?", (key,))
+
+    def save_profile(self, profile: Dict, capacity: int):
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO profiles (id, created_at, data) VALUES (?, ?, ?)",
+                     (profile['id'], profile['created_at'], _dumps(profile)))
+        conn.execute("DELETE FROM profiles WHERE id NOT IN (SELECT id FROM profiles ORDER BY created_at DESC LIMIT ?)",
+                     (capacity,))
+
+    def list_profiles(self) -> List[Dict]:
+        rows = self._conn().execute("SELECT data FROM profiles ORDER BY created_at DESC").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def load_profile(self, profile_id: str) -> Optional[Dict]:
+        row = self._conn().execute("SELECT data FROM profiles WHERE id = ?", (profile_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+
+class RedisStateStore(StateStore):
+    """Store backed by Redis (or a Redis-compatible server) for multi-node deployments"""
+
+    def __init__(self, url: str, prefix: str = "texttosql"):
+        import redis
+        self.redis = redis.Redis.from_url(url)
+        self.watch_error = redis.WatchError
+        self.prefix = prefix
+
+    def _key(self, *parts: str) -> str:
+        return ":".join((self.prefix,) + parts)
+
+    def save_session(self, session_id: str, data: Dict):
+        pipe = self.redis.pipeline()
+        pipe.set(self._key("session", session_id), _dumps(data))
+        pipe.zadd(self._key("sessions"), {session_id: data['last_accessed']})
+        pipe.execute()
+
+    def load_session(self, session_id: str) -> Optional[Dict]:
+        pipe = self.redis.pipeline()
+        pipe.get(self._key("session", session_id))
+        pipe.zscore(self._key("sessions"), session_id)
+        raw, last_accessed = pipe.execute()
+        if raw is None:
+            return None
+        session = json.loads(raw)
+        if last_accessed is not None:
+            session['last_accessed'] = last_accessed
+        return session
+
+    def touch_session(self, session_id: str, timestamp: float):
+        self.redis.zadd(self._key("sessions"), {session_id: timestamp}, xx=True)
+
+    def delete_session(self, session_id: str):
+        pipe = self.redis.pipeline()
+        pipe.delete(self._key("session", session_id))
+        pipe.zrem(self._key("sessions"), session_id)
+        pipe.execute()
+
+    def expired_sessions(self, cutoff: float) -> List[str]:
+        return [sid.decode() for sid in self.redis.zrangebyscore(self._key("sessions"), "-inf", f"({cutoff}")]
+
+    def count_sessions(self) -> int:
+        return self.redis.zcard(self._key("sessions"))
+
+    def save_job(self, job: Dict):
+        pipe = self.redis.pipeline()
+        pipe.set(self._key("job", job['id']), _dumps(job))
+        pipe.sadd(self._key("jobs", job['status']), job['id'])
+        pipe.zadd(self._key("jobs", "created"), {job['id']: job['created_at']})
+        pipe.lpush(self._key("jobs", "pending"), job['id'])
+        pipe.execute()
+
+    def load_job(self, job_id: str) -> Optional[Dict]:
+        raw = self.redis.get(self._key("job", job_id))
+        return json.loads(raw) if raw else None
+
+    def update_job(self, job_id: str, fields: Dict, expected_status: Optional[str] = None) -> bool:
+        key = self._key("job", job_id)
+        with self.redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    raw = pipe.get(key)
+                    job = json.loads(raw) if raw is not None else None
+                    if job is None or (expected_status is not None and job['status'] != expected_status):
+                        pipe.unwatch()
+                        return False
+                    previous = job['status']
+                    job.update(fields)
+                    pipe.multi()
+                    pipe.set(key, _dumps(job))
+                    if job['status'] != previous:
+                        pipe.smove(self._key("jobs", previous), self._key("jobs", job['status']), job_id)
+                    pipe.execute()
+                    return True
+                except self.watch_error:
+                    continue
+
+    def claim_next_job(self, fields: Optional[Dict] = None) -> Optional[str]:
+        while True:
+            raw_id = self.redis.rpop(self._key("jobs", "pending"))
+            if raw_id is None:
+                return None
+            job_id = raw_id.decode()
+            # Jobs cancelled or cleaned up while waiting are skipped
+            if self.update_job(job_id, dict(fields or {}, status=PROCESSING, started_at=time.time()), expected_status=QUEUED):
+                return job_id
+
+    def requeue_job(self, job_id: str, fields: Optional[Dict] = None) -> bool:
+        if not self.update_job(job_id, dict(fields or {}, status=QUEUED), expected_status=PROCESSING):
+            return False
+        # Claims pop from the right, so the requeued job is taken next
+        self.redis.rpush(self._key("jobs", "pending"), job_id)
+        return True
+
+    def list_jobs(self, status: str) -> List[Dict]:
+        job_ids = [jid.decode() for jid in self.redis.smembers(self._key("jobs", status))]
+        if not job_ids:
+            return []
+        raws = self.redis.mget([self._key("job", job_id) for job_id in job_ids])
+        return [job for job in (json.loads(raw) for raw in raws if raw) if job['status'] == status]
+
+    def job_counts(self) -> Dict[str, int]:
+        pipe = self.redis.pipeline()
+        for status in JOB_STATUSES:
+            pipe.scard(self._key("jobs", status))
+        return dict(zip(JOB_STATUSES, pipe.execute()))
+
+    def delete_jobs_before(self, cutoff: float):
+        job_ids = [jid.decode() for jid in self.redis.zrangebyscore(self._key("jobs", "created"), "-inf", f"({cutoff}")]
+        for job_id in job_ids:
+            job = self.load_job(job_id)
+            pipe = self.redis.pipeline()
+            pipe.delete(self._key("job", job_id))
+            pipe.delete(self._key("payloads", job_id))
+            pipe.zrem(self._key("jobs", "created"), job_id)
+            if job:
+                pipe.srem(self._key("jobs", job['status']), job_id)
+            pipe.execute()
+
+    def save_payload(self, job_id: str, fmt: str, data: bytes):
+        self.redis.hset(self._key("payloads", job_id), fmt, data)
+
+    def load_payload(self, job_id: str, fmt: str) -> Optional[bytes]:
+        return self.redis.hget(self._key("payloads", job_id), fmt)
+
+    def save_schema(self, key: str, schema: List[Dict]):
+        self.redis.set(self._key("schema", key), _dumps(schema))
+
+    def load_schema(self, key: str) -> Optional[List[Dict]]:
+        raw = self.redis.get(self._key("schema", key))
+        return json.loads(raw) if raw else None
+
+    def delete_schema(self, key: str):
+        self.redis.delete(self._key("schema", key))
+
+    def save_profile(self, profile: Dict, capacity: int):
+        pipe = self.redis.pipeline()
+        pipe.lpush(self._key("profiles"), _dumps(profile))
+        pipe.ltrim(self._key("profiles"), 0, capacity - 1)
+        pipe.execute()
+
+    def list_profiles(self) -> List[Dict]:
+        return [json.loads(raw) for raw in self.redis.lrange(self._key("profiles"), 0, -1)]
+
+
+def create_state_store(url: Optional[str] = None) -> StateStore:
+    """Create the store selected by STATE_STORE_URL (memory://, sqlite:///path or redis://host:port/db)"""
+    url = url or os.getenv("STATE_STORE_URL", "memory://")
+    if url.startswith("memory://"):
+        return MemoryStateStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteStateStore(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStateStore(url)
+    raise ValueError(f"Unsupported state store URL: {url}")
@@ -0,0 +1,206 @@
+import logging
+import os
+import re
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy import text
+from .database import DatabaseManager
+from .state_store import StateStore
+
+logger = logging.getLogger(__name__)
+
+_TEXT_TYPES = ("CHAR", "TEXT", "STRING", "ENUM", "CLOB")
+_RANGE_TYPES = ("INT", "NUM", "DEC", "REAL", "FLOAT", "DOUBLE", "DATE", "TIME")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def _kind(column_type: str) -> Optional[str]:
+    upper = column_type.upper()
+    if any(t in upper for t in _TEXT_TYPES):
+        return "text"
+    if any(t in upper for t in _RANGE_TYPES):
+        return "range"
+    return None
+
+
+def _stem(word: str) -> str:
+    # Crude plural folding, enough to tie "statuses"/"countries" in a question to column names
+    if len(word) <= 3:
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("sses", "uses", "xes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def _words(value: str) -> set:
+    return {_stem(w) for w in _WORD_RE.findall(value.lower())}
+
+
+class ValueIndexer:
+    """Builds a per-session index of column statistics and the distinct values of low-cardinality text columns.
+
+    Runs from a background loop, a few columns per pass, over a bounded sample of
+    each table, and stores the index next to the session's schema snapshot. Columns
+    already profiled for an earlier snapshot are carried over when the schema
+    changes, so only new or stale columns hit the database again. The request
+    path only ever reads the stored index.
+    """
+
+    def __init__(self, store: StateStore, max_distinct: int = 50, sample_rows: int = 10000,
+                 batch_columns: int = 8, max_age: float = 3600, max_value_length: int = 64):
+        self.store = store
+        self.max_distinct = max_distinct
+        self.sample_rows = sample_rows
+        self.batch_columns = batch_columns
+        self.max_age = max_age
+        self.max_value_length = max_value_length
+
+    def load(self, key: str, fingerprint: Optional[str]) -> Optional[Dict]:
+        """Stored index for a session, or None if it was built for a different schema"""
+        index = self.store.load_value_index(key)
+        if index is None or (fingerprint and index.get("fingerprint") != fingerprint):
+            return None
+        return index
+
+    def _pending(self, schema: List[Dict], columns: Dict[str, Dict], now: float) -> List[Tuple[str, Dict, Dict]]:
+        pending = []
+        for table in schema:
+            for column in table["columns"]:
+                if column.get("primary_key") or column.get("foreign_key") or _kind(column["type"]) is None:
+                    continue
+                entry = columns.get(f"{table['name']}.{column['name']}")
+                if entry is None or entry["type"] != column["type"] or now - entry["profiled_at"] > self.max_age:
+                    pending.append((f"{table['name']}.{column['name']}", table, column))
+        return pending
+
+    def step(self, key: str, db_manager: DatabaseManager, schema: List[Dict], fingerprint: str) -> int:
+        """Profile the next batch of unprofiled or stale columns; returns how many were profiled"""
+        now = time.time()
+        previous = self.store.load_value_index(key) or {}
+        known = {name for table in schema for name in (f"{table['name']}.{c['name']}" for c in table["columns"])}
+        columns = {name: entry for name, entry in previous.get("columns", {}).items() if name in known}
+        pending = self._pending(schema, columns, now)
+        if not pending and previous.get("fingerprint") == fingerprint:
+            return 0
+
+        start = time.perf_counter()
+        batch = pending[:self.batch_columns]
+        for name, table, column in batch:
+            try:
+                columns[name] = self._profile_column(db_manager, table["name"], column)
+            except Exception as e:
+                # Recorded anyway so a column the sample query cannot handle is not retried every pass
+                logger.warning(f"Value index skipped {name}: {e}")
+                columns[name] = {"type": column["type"], "profiled_at": now, "error": str(e)}
+
+        self.store.save_value_index(key, {
+            "fingerprint": fingerprint,
+            "columns": columns,
+            "complete": len(pending) <= len(batch),
+            "updated_at": now,
+        })
+        if batch:
+            logger.info(f"📇 Profiled {len(batch)} columns for session {key[:8]} in {time.perf_counter() - start:.2f}s "
+                        f"({len(pending) - len(batch)} remaining)")
+        return len(batch)
+
+    def _profile_column(self, db_manager: DatabaseManager, table: str, column: Dict) -> Dict:
+        quote = db_manager.engine.dialect.identifier_preparer.quote
+        col, tbl = quote(column["name"]), quote(table)
+        sample = f"(SELECT {col} AS v FROM {tbl} LIMIT :rows) sampled"
+        entry = {"type": column["type"], "profiled_at": time.time()}
+        with db_manager.engine.connect() as conn:
+            if _kind(column["type"]) == "text":
+                rows = conn.execute(
+                    text(f"SELECT v, COUNT(*) AS n FROM {sample} GROUP BY v ORDER BY n DESC LIMIT :limit"),
+                    {"rows": self.sample_rows, "limit": self.max_distinct + 2}
+                ).fetchall()
+                values = [(v, n) for v, n in rows if v is not None]
+                # More distinct values than the limit means the column is not an enumeration
+                entry["low_cardinality"] = len(values) <= self.max_distinct
+                if entry["low_cardinality"]:
+                    # All groups were returned, so the counts cover the whole sample
+                    entry["rows_sampled"] = sum(n for _, n in rows)
+                    entry["nulls"] = sum(n for v, n in rows if v is None)
+                    entry["distinct"] = len(values)
+                    # Every sampled value distinct (names, emails, codes): only hinted when the question names one
+                    entry["unique"] = len(values) == entry["rows_sampled"] - entry["nulls"]
+                    entry["values"] = [str(v) for v, _ in values if len(str(v)) <= self.max_value_length]
+            else:
+                row = conn.execute(
+                    text(f"SELECT COUNT(*), COUNT(v), MIN(v), MAX(v) FROM {sample}"),
+                    {"rows": self.sample_rows}
+                ).fetchone()
+                entry["rows_sampled"] = row[0]
+                entry["nulls"] = row[0] - row[1]
+                entry["min"] = None if row[2] is None else str(row[2])
+                entry["max"] = None if row[3] is None else str(row[3])
+        return entry
+
+
+def relevant_values(index: Optional[Dict], question: str, count_tokens: Callable[[str], int],
+                    budget: int = 200) -> Tuple[str, List[str]]:
+    """Value hints for the columns a question mentions, within ``budget`` tokens.
+
+    Returns the hint text and the values that appear verbatim in the question.
+    Columns whose values occur in the question rank first, then columns named
+    by the question; the most frequent values of each are listed first. Columns
+    whose sampled values were all distinct only contribute the values it names.
+    """
+    if not index or budget <= 0:
+        return "", []
+    lowered = question.lower()
+    question_words = _words(question)
+    scored = []
+    matched: List[str] = []
+    for name, entry in index.get("columns", {}).items():
+        values = entry.get("values")
+        if not values:
+            continue
+        hits = [v for v in values if re.search(rf"(?<!\w){re.escape(v.lower())}(?!\w)", lowered)]
+        if entry.get("unique"):
+            values = hits
+        table, column = name.split(".", 1)
+        table_words = _words(table)
+        # "order_number" in "orders" is named by "number", not by "order"
+        named = len((_words(column) - table_words) & question_words)
+        if not hits and not named:
+            continue
+        matched.extend(hits)
+        score = 10 * len(hits) + named + 0.5 * len(table_words & question_words)
+        scored.append((score, name, hits, values))
+    scored.sort(key=lambda s: -s[0])
+
+    lines, used = [], 0
+    for _, name, hits, values in scored:
+        ordered = hits + [v for v in values if v not in hits]
+        line = f"-- {name}: " + ", ".join("'" + v.replace("'", "''") + "'" for v in ordered)
+        cost = count_tokens(line + "\n")
+        while cost > budget - used and len(ordered) > max(len(hits), 1):
+            # Trim the tail of long value lists rather than dropping the column entirely
+            ordered = ordered[:max(len(hits), 1, len(ordered) // 2)]
+            line = f"-- {name}: " + ", ".join("'" + v.replace("'", "''") + "'" for v in ordered) + ", ..."
+            cost = count_tokens(line + "\n")
+        if cost > budget - used:
+            continue
+        lines.append(line)
+        used += cost
+    return "\n".join(lines), matched
+
+
+def create_value_indexer(store: StateStore) -> Optional[ValueIndexer]:
+    """Indexer configured from VALUE_INDEX_* variables; None when VALUE_INDEX_MAX_DISTINCT is 0"""
+    max_distinct = int(os.getenv("VALUE_INDEX_MAX_DISTINCT", "50"))
+    if max_distinct <= 0:
+        return None
+    return ValueIndexer(
+        store,
+        max_distinct=max_distinct,
+        sample_rows=int(os.getenv("VALUE_INDEX_SAMPLE_ROWS", "10000")),
+        batch_columns=int(os.getenv("VALUE_INDEX_BATCH_COLUMNS", "8")),
+        max_age=float(os.getenv("VALUE_INDEX_MAX_AGE", "3600"))
+    )
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import nullcontext
+from typing import Optional
+from .metrics import StageTimer, QUERIES_TOTAL
+from .cancellation import CancelToken, QueryCancelled
+from .profiling import SlowJobProfiler, create_profiler
+from .nlp_service import NLPService
+from .query_queue import QueryQueue, QueryStatus
+from .session_manager import SessionManager
+from .serialization import EAGER_FORMATS, encode_result, result_etag, result_metadata
+
+logger = logging.getLogger(__name__)
+
+class QueryWorker:
+    """Claims queued queries and runs them through the model and the session's database.
+
+    Runs inside the API process when INFERENCE_MODE=local, or as a dedicated
+    inference process (``python -m app.worker``) sharing the state store with
+    stateless API processes.
+    """
+
+    def __init__(self, query_queue: QueryQueue, session_manager: SessionManager, nlp_service: NLPService,
+                 cancel_poll_interval: float = 0.5, profiler: Optional[SlowJobProfiler] = None):
+        self.query_queue = query_queue
+        self.session_manager = session_manager
+        self.nlp_service = nlp_service
+        self.cancel_poll_interval = cancel_poll_interval
+        self.profiler = profiler
+
+    async def run(self):
+        """Process queued queries until cancelled"""
+        while True:
+            try:
+                query_id = await self.query_queue.get_next_query()
+                if query_id:
+                    await self.process_query(query_id)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in query processor: {e}")
+
+    async def _watch_cancellation(self, query_id: str, token: CancelToken):
+        """Trip the token when the job passes its deadline or a cancel is requested through the store,
+        renewing the job's lease meanwhile so other processes know this worker is alive"""
+        renew_interval = self.query_queue.lease_seconds / 3
+        last_renewal = time.monotonic()
+        while not token.is_cancelled():
+            await asyncio.sleep(self.cancel_poll_interval)
+            if self.query_queue.is_cancel_requested(query_id):
+                token.cancel("Query cancelled by user")
+            elif time.monotonic() - last_renewal >= renew_interval:
+                last_renewal = time.monotonic()
+                if not self.query_queue.renew_lease(query_id):
+                    # Recovered by another process (deadline or lease passed); its outcome stands
+                    token.cancel("Query was recovered by another worker")
+
+    def _finish(self, query_id: str, status: QueryStatus, **fields):
+        # Only while still processing: a job recovered after its lease lapsed keeps the outcome it was given
+        if self.query_queue.update_query_status(query_id, status, expected_status=QueryStatus.PROCESSING, **fields):
+            QUERIES_TOTAL.labels(status=status.value).inc()
+        else:
+            logger.warning(f"Query {query_id[:8]} was recovered by another process; dropping its {status.value} result")
+
+    async def process_query(self, query_id: str):
+        """Process a single claimed query"""
+        queued_query = self.query_queue.get_query_status(query_id)
+        if not queued_query:
+            return
+
+        timer = StageTimer(queued_query.timings)
+        started_at = queued_query.started_at or queued_query.created_at
+        timer.record("queue_wait", (started_at - queued_query.created_at).total_seconds(),
+                     start_ns=int(queued_query.created_at.timestamp() * 1e9))
+        start = time.perf_counter()
+        status = QueryStatus.FAILED
+        token = CancelToken(deadline=queued_query.deadline.timestamp() if queued_query.deadline else None)
+        self.query_queue.cancel_tokens[query_id] = token
+        watcher = asyncio.create_task(self._watch_cancellation(query_id, token))
+
+        try:
+            db_manager = self.session_manager.get_session(queued_query.session_id)
+            if not db_manager or not db_manager.is_connected():
+                raise Exception("No database connection for session")
+
+            # Process query asynchronously
+            def process_nlp_query():
+                # Profiling wraps the executor thread, where schema reflection, generation and row conversion run
+                details = {"query": queued_query.query, "timings": timer.timings}
+                with self.profiler.profile(query_id, details) if self.profiler else nullcontext():
+                    return run_pipeline()
+
+            def run_pipeline():
+                with timer.stage("get_schema"):
+                    schema_dict = self.session_manager.get_schema(queued_query.session_id)
+                    # Built in the background; a session without one yet simply gets no value hints
+                    value_index = self.session_manager.get_value_index(queued_query.session_id)
+                token.check()
+                sql = self.nlp_service.text_to_sql(queued_query.query, schema_dict, queued_query.context, timer=timer,
+                                                   cancel_token=token, value_index=value_index)
+                result = db_manager.execute_query(sql, timer=timer, cancel_token=token)
+                if not timer.timings.get("template_hit"):
+                    _, matched_values = self.nlp_service.value_hints(queued_query.query, value_index)
+                    self.nlp_service.remember_sql(queued_query.query, schema_dict, sql, matched_values)
+                result["explanation"] = self.nlp_service.get_explanation(sql, queued_query.query)
+                # Serialize once here so status polls can return the stored bytes as-is
+                with timer.stage("serialization"):
+                    payloads = {fmt: encode_result(result, fmt) for fmt in EAGER_FORMATS}
+                    for fmt, payload in payloads.items():
+                        self.query_queue.save_result_payload(query_id, fmt, payload)
+                metadata = result_metadata(result)
+                # Lets the API answer conditional requests without loading the payload
+                metadata["etag"] = result_etag(payloads["columnar"])
+                return metadata
+
+            query_result = await asyncio.get_event_loop().run_in_executor(None, process_nlp_query)
+            status = QueryStatus.COMPLETED
+            timer.record("total", time.perf_counter() - start)
+            self._finish(query_id, QueryStatus.COMPLETED, result=query_result, timings=timer.timings)
+
+        except QueryCancelled as e:
+            status = QueryStatus.CANCELLED
+            timer.record("total", time.perf_counter() - start)
+            self._finish(query_id, QueryStatus.CANCELLED, error=str(e), timings=timer.timings)
+        except Exception as e:
+            timer.record("total", time.perf_counter() - start)
+            error_message = self.nlp_service.format_error_with_query(str(e), "", queued_query.query)
+            self._finish(query_id, QueryStatus.FAILED, error=error_message, timings=timer.timings)
+        finally:
+            watcher.cancel()
+            self.query_queue.cancel_tokens.pop(query_id, None)
+            timer.export_trace(query_id, int(queued_query.created_at.timestamp() * 1e9), status.value)
+
+
+async def value_index_loop(session_manager: SessionManager):
+    """Background task that incrementally profiles column values for connected sessions.
+
+    Runs in whichever role runs queries: the API process in local mode, the workers in remote mode.
+    """
+    interval = float(os.getenv("VALUE_INDEX_INTERVAL", "5"))
+    while True:
+        try:
+            await asyncio.sleep(interval)
+            await asyncio.get_event_loop().run_in_executor(None, session_manager.build_value_indexes)
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error(f"Error building value index: {e}")
+
+
+def main():
+    """Entry point for a dedicated inference worker process"""
+    from prometheus_client import start_http_server
+    from .state_store import create_state_store
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    store = create_state_store()
+    worker = QueryWorker(
+        QueryQueue(store),
+        SessionManager(store=store),
+        NLPService(),
+        profiler=create_profiler(store)
+    )
+    metrics_port = os.getenv("WORKER_METRICS_PORT")
+    if metrics_port:
+        start_http_server(int(metrics_port))
+    logger.info("Inference worker started, waiting for queries...")
+
+    async def serve():
+        async def cleanup():
+            # Release engines for sessions that expired or disconnected via an API process
+            while True:
+                await asyncio.sleep(int(os.getenv("SESSION_CLEANUP_INTERVAL", "30")))
+                worker.session_manager.cleanup_expired_sessions()
+
+        cleanup_task = asyncio.create_task(cleanup())
+        value_index_task = asyncio.create_task(value_index_loop(worker.session_manager))
+        try:
+            await worker.run()
+        finally:
+            cleanup_task.cancel()
+            value_index_task.cancel()
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+"""Offline benchmarks for the natural language to SQL pipeline.
+
+Run with ``python -m benchmarks`` from the backend directory. Results are
+written as JSON so two runs can be compared with ``python -m benchmarks.compare``.
+"""
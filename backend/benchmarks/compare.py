@@ -0,0 +1,45 @@
+import argparse
+import json
+from typing import Dict
+
+
+def flatten(data, prefix: str = "") -> Dict[str, float]:
+    values = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            values.update(flatten(value, f"{prefix}.{key}" if prefix else key))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        values[prefix] = data
+    return values
+
+
+def compare(baseline: Dict, candidate: Dict) -> Dict[str, Dict[str, float]]:
+    """Per-metric deltas between two benchmark reports"""
+    base = flatten(baseline.get("datasets", {}))
+    cand = flatten(candidate.get("datasets", {}))
+    deltas = {}
+    for key in sorted(base.keys() & cand.keys()):
+        change = ((cand[key] - base[key]) / base[key] * 100) if base[key] else 0.0
+        deltas[key] = {"baseline": base[key], "candidate": cand[key], "change_pct": round(change, 2)}
+    return deltas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark JSON reports")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.0, help="Only show metrics that moved by at least this many percent")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    for key, delta in compare(baseline, candidate).items():
+        if abs(delta["change_pct"]) >= args.threshold:
+            print(f"{key:70s} {delta['baseline']:>12} -> {delta['candidate']:>12} ({delta['change_pct']:+.2f}%)")
+
+
+if __name__ == "__main__":
+    main()
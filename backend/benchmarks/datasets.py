@@ -0,0 +1,101 @@
+import os
+import re
+import shutil
+import sqlite3
+from typing import Dict, List, Optional
+
+SAMPLE_DB = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "database", "sample_ecommerce.db"))
+
+
+def _user_tables(conn: sqlite3.Connection) -> List[str]:
+    return [
+        row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        )
+    ]
+
+
+def _unique_columns(conn: sqlite3.Connection, table: str) -> set:
+    """Columns that take part in a UNIQUE or PRIMARY KEY index"""
+    columns = set()
+    for index in conn.execute(f"PRAGMA index_list('{table}')"):
+        name, unique = index[1], index[2]
+        if unique:
+            columns.update(info[2] for info in conn.execute(f"PRAGMA index_info('{name}')"))
+    return columns
+
+
+def _grow_table(conn: sqlite3.Connection, table: str, target_rows: int):
+    """Double a table's rows until it holds target_rows, keeping unique columns unique"""
+    info = list(conn.execute(f"PRAGMA table_info('{table}')"))
+    pk_columns = [col[1] for col in info if col[5]]
+    unique = _unique_columns(conn, table)
+    rowid_pk = len(pk_columns) == 1 and info[[col[1] for col in info].index(pk_columns[0])][2].upper() == "INTEGER"
+    if not rowid_pk:
+        unique.update(pk_columns)
+
+    generation = 0
+    count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    while 0 < count < target_rows:
+        generation += 1
+        columns, expressions = [], []
+        for col in info:
+            name, col_type = col[1], (col[2] or "").upper()
+            if rowid_pk and name == pk_columns[0]:
+                continue
+            columns.append(name)
+            if name in unique:
+                if "INT" in col_type:
+                    low, high = conn.execute(f"SELECT MIN({name}), MAX({name}) FROM {table}").fetchone()
+                    expressions.append(f"{name} + {(high or 0) - (low or 0) + 1}")
+                else:
+                    expressions.append(f"{name} || '#{generation}'")
+            else:
+                expressions.append(name)
+        limit = min(count, target_rows - count)
+        conn.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"SELECT {', '.join(expressions)} FROM {table} LIMIT {limit}"
+        )
+        count += limit
+
+
+def scale_database(dst: str, factor: int = 1, target_rows: Optional[Dict[str, int]] = None,
+                   schema_copies: int = 0, src: str = SAMPLE_DB) -> str:
+    """Create a synthetic copy of the sample database.
+
+    Every table is grown to ``factor`` times its original row count (or to the
+    explicit ``target_rows`` per table), and ``schema_copies`` empty duplicates
+    of each table are added to widen the schema for reflection and prompt
+    size measurements.
+    """
+    if os.path.exists(dst):
+        os.unlink(dst)
+    shutil.copyfile(src, dst)
+
+    conn = sqlite3.connect(dst)
+    try:
+        tables = _user_tables(conn)
+        for table in tables:
+            count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            rows = (target_rows or {}).get(table, count * factor)
+            _grow_table(conn, table, rows)
+
+        for table in tables:
+            create_sql = conn.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+            ).fetchone()[0]
+            for copy in range(1, schema_copies + 1):
+                conn.execute(re.sub(r"^CREATE TABLE\s+\S+", f"CREATE TABLE {table}_{copy}", create_sql))
+        conn.commit()
+    finally:
+        conn.close()
+    return dst
+
+
+def table_row_counts(path: str) -> Dict[str, int]:
+    conn = sqlite3.connect(path)
+    try:
+        return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in _user_tables(conn)}
+    finally:
+        conn.close()
@@ -0,0 +1,98 @@
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from typing import Dict
+
+from app.database import DatabaseManager
+from app.export import TYPED_FORMATS, available_export_formats, scan_arrow_schema, stream_export
+from .datasets import scale_database
+from .run import _git_revision
+from . import suite
+
+EXPORT_SQL = "SELECT * FROM order_items"
+
+
+def _export(db_path: str, fmt: str, batch_size: int, results):
+    """Run one export in a fresh process so its RSS high-water mark is its own"""
+    baseline_rss = suite.max_rss_mb()
+    db_manager = DatabaseManager()
+    db_manager.connect_sqlite(db_path)
+    start = time.perf_counter()
+    total_bytes, rows = 0, 0
+
+    def counted():
+        nonlocal rows
+        for columns, batch in db_manager.stream_query(EXPORT_SQL, batch_size=batch_size):
+            rows += len(batch)
+            yield columns, batch
+
+    # Timed like the endpoint, including the type-scan pass typed formats make first
+    schema = scan_arrow_schema(db_manager.stream_query(EXPORT_SQL, batch_size=batch_size)) if fmt in TYPED_FORMATS else None
+    for chunk in stream_export(counted(), fmt, schema):
+        total_bytes += len(chunk)
+    elapsed = time.perf_counter() - start
+    db_manager.disconnect()
+    results.put({
+        "rows": rows,
+        "bytes": total_bytes,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed) if elapsed else 0,
+        "mb_per_second": round(total_bytes / (1024 * 1024) / elapsed, 2) if elapsed else 0.0,
+        "baseline_rss_mb": baseline_rss,
+        "max_rss_mb": suite.max_rss_mb(),
+    })
+
+
+def run_export(db_path: str, fmt: str, batch_size: int) -> Dict:
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_export, args=(db_path, fmt, batch_size, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark streaming export of a large generated-query result")
+    parser.add_argument("--rows", type=int, default=10_000_000, help="Rows in the scaled order_items table")
+    parser.add_argument("--formats", type=lambda s: s.split(","), default=available_export_formats())
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--workdir", help="Directory for the scaled database (reused between runs if present)")
+    parser.add_argument("--output", default="-", help="JSON output path, '-' for stdout")
+    args = parser.parse_args(argv)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": _git_revision(),
+            "args": {k: v for k, v in vars(args).items() if k != "output"},
+        },
+        "datasets": {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or tmp
+        os.makedirs(workdir, exist_ok=True)
+        db_path = os.path.join(workdir, f"sample_order_items_{args.rows}.db")
+        if not os.path.exists(db_path):
+            start = time.perf_counter()
+            scale_database(db_path, target_rows={"order_items": args.rows})
+            report["meta"]["build_seconds"] = round(time.perf_counter() - start, 3)
+        report["datasets"][f"export_{args.rows}"] = {
+            fmt: run_export(db_path, fmt, args.batch_size) for fmt in args.formats
+        }
+
+    output = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(output)
+    else:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict
+
+from app.backends import StubBackend, create_backend
+from app.nlp_service import NLPService
+from .datasets import scale_database, table_row_counts
+from . import suite
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def build_model(args):
+    if args.model == "llama" and args.model_path:
+        from app.backends.llama_local import LlamaCppBackend
+        backend = LlamaCppBackend(model_path=args.model_path)
+    elif args.model == "stub":
+        backend = StubBackend(first_token_latency=args.first_token_latency, token_latency=args.token_latency)
+    else:
+        backend = create_backend(args.model)
+    if not backend.is_ready():
+        sys.exit(f"{args.model} backend is not available; use --model stub to run offline")
+    return NLPService(backend=backend)
+
+
+def run_dataset(nlp: NLPService, db_path: str, args) -> Dict:
+    db_manager = suite.connect(db_path)
+    schema = [table.dict() for table in db_manager.get_schema()]
+    db_manager.disconnect()
+
+    result = {
+        "rows": table_row_counts(db_path),
+        "schema_reflection": suite.bench_schema_reflection(db_path, args.repeats),
+        "prompt": suite.bench_prompt_size(nlp, schema),
+        "generation": suite.bench_generation(nlp, schema, args.repeats),
+        "queue": {},
+    }
+    for clients in args.clients:
+        result["queue"][f"clients_{clients}"] = suite.bench_queue_throughput(nlp, db_path, clients, args.queries_per_client)
+    result["max_rss_mb"] = suite.max_rss_mb()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the natural language to SQL pipeline")
+    parser.add_argument("--model", choices=["stub", "llama", "http"], default="stub",
+                        help="Model backend; http uses MODEL_SERVER_URL")
+    parser.add_argument("--model-path", help="GGUF file to load when --model llama")
+    parser.add_argument("--first-token-latency", type=float, default=0.05, help="Stub model latency before the first token (s)")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="Stub model latency per token (s)")
+    parser.add_argument("--scales", type=lambda s: [int(x) for x in s.split(",")], default=[1, 100],
+                        help="Row multipliers for the synthetic copies of the sample database")
+    parser.add_argument("--schema-copies", type=int, default=0, help="Empty duplicates of each table to widen the schema")
+    parser.add_argument("--clients", type=lambda s: [int(x) for x in s.split(",")], default=[1, 4, 16])
+    parser.add_argument("--queries-per-client", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--workdir", help="Directory for the scaled databases (defaults to a temp dir)")
+    parser.add_argument("--output", default="-", help="JSON output path, '-' for stdout")
+    args = parser.parse_args(argv)
+
+    nlp = build_model(args)
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": {k: v for k, v in vars(args).items() if k != "output"},
+        },
+        "datasets": {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or tmp
+        os.makedirs(workdir, exist_ok=True)
+        for scale in args.scales:
+            db_path = os.path.join(workdir, f"sample_x{scale}_w{args.schema_copies}.db")
+            scale_database(db_path, factor=scale, schema_copies=args.schema_copies)
+            report["datasets"][f"x{scale}"] = run_dataset(nlp, db_path, args)
+
+    output = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(output)
+    else:
+        with open(args.output, "w") as f:
+            f.write(output)
@@ -0,0 +1,159 @@
+import asyncio
+import resource
+import statistics
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from app.database import DatabaseManager
+from app.metrics import StageTimer
+from app.nlp_service import NLPService
+from app.query_queue import QueryQueue, QueryStatus
+from app.session_manager import SessionManager
+from app.state_store import MemoryStateStore
+from app.worker import QueryWorker
+
+QUESTIONS = [
+    "Show the 10 most recent orders",
+    "List all customers who registered this year",
+    "Which products are low on stock?",
+    "Total order_items quantity per product",
+    "Show suppliers with a rating above 4",
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds"""
+    ms = [s * 1000 for s in samples]
+    return {
+        "count": len(ms),
+        "mean_ms": round(statistics.mean(ms), 3) if ms else 0.0,
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "max_ms": round(max(ms), 3) if ms else 0.0,
+    }
+
+
+def traced_peak_mb(fn: Callable[[], object]) -> float:
+    """Run fn once under tracemalloc and return its Python heap high-water mark"""
+    tracemalloc.start()
+    try:
+        fn()
+        return round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 3)
+    finally:
+        tracemalloc.stop()
+
+
+def max_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def connect(db_path: str) -> DatabaseManager:
+    db_manager = DatabaseManager()
+    db_manager.connect_sqlite(db_path)
+    return db_manager
+
+
+def bench_schema_reflection(db_path: str, repeats: int) -> Dict:
+    db_manager = connect(db_path)
+    try:
+        samples = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            tables = db_manager.get_schema()
+            samples.append(time.perf_counter() - start)
+        result = summarize(samples)
+        result["tables"] = len(tables)
+        result["peak_heap_mb"] = traced_peak_mb(db_manager.get_schema)
+        return result
+    finally:
+        db_manager.disconnect()
+
+
+def bench_prompt_size(nlp: NLPService, schema: List[Dict]) -> Dict:
+    schema_text = nlp._build_schema_context(schema)
+    # Templates learned by an earlier queue run would answer without building a prompt
+    nlp.templates.clear()
+    timer = StageTimer()
+    nlp.text_to_sql(QUESTIONS[0], schema, timer=timer)
+    return {
+        "schema_chars": len(schema_text),
+        "prompt_tokens": timer.timings.get("prompt_tokens", 0),
+    }
+
+
+def bench_generation(nlp: NLPService, schema: List[Dict], repeats: int) -> Dict:
+    latencies, ttfts, throughput = [], [], []
+    template_hits = 0
+    nlp.templates.clear()
+    for i in range(repeats):
+        timer = StageTimer()
+        nlp.text_to_sql(QUESTIONS[i % len(QUESTIONS)], schema, timer=timer)
+        if timer.timings.get("template_hit"):
+            # Nothing was generated, so there is no latency to record
+            template_hits += 1
+            continue
+        latencies.append(timer.timings["generation"])
+        ttfts.append(timer.timings["time_to_first_token"])
+        if "tokens_per_second" in timer.timings:
+            throughput.append(timer.timings["tokens_per_second"])
+    result = summarize(latencies)
+    result["ttft_p50_ms"] = round(percentile(ttfts, 50) * 1000, 3)
+    result["tokens_per_second_mean"] = round(statistics.mean(throughput), 2) if throughput else 0.0
+    result["template_hits"] = template_hits
+    return result
+
+
+async def _run_queue(nlp: NLPService, db_path: str, clients: int, queries_per_client: int) -> Dict:
+    store = MemoryStateStore()
+    query_queue = QueryQueue(store)
+    session_manager = SessionManager(store=store)
+    session_id = session_manager.create_session()
+    session_manager.get_session(session_id).connect_sqlite(db_path)
+    session_manager.save_connection(session_id)
+    worker = QueryWorker(query_queue, session_manager, nlp)
+    # Start cold so repeated questions show the template cache at work within this run only
+    nlp.templates.clear()
+    expected = clients * queries_per_client
+
+    async def client(index: int) -> List[float]:
+        latencies = []
+        for i in range(queries_per_client):
+            start = time.perf_counter()
+            query_id = await query_queue.add_query(session_id, QUESTIONS[(index + i) % len(QUESTIONS)])
+            while query_queue.get_query_status(query_id).status in (QueryStatus.QUEUED, QueryStatus.PROCESSING):
+                await asyncio.sleep(0.005)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    processor = asyncio.create_task(worker.run())
+    start = time.perf_counter()
+    results = await asyncio.gather(*(client(i) for i in range(clients)))
+    wall = time.perf_counter() - start
+    processor.cancel()
+    session_manager.cleanup_session(session_id)
+
+    latencies = [latency for client_latencies in results for latency in client_latencies]
+    result = summarize(latencies)
+    result.update({
+        "clients": clients,
+        "queries": expected,
+        "failed": query_queue.status_counts()[QueryStatus.FAILED],
+        "wall_seconds": round(wall, 3),
+        "throughput_qps": round(expected / wall, 3) if wall else 0.0,
+        "template_hit_rate": nlp.templates.hit_rate(),
+    })
+    return result
+
+
+def bench_queue_throughput(nlp: NLPService, db_path: str, clients: int, queries_per_client: int) -> Dict:
+    return asyncio.run(_run_queue(nlp, db_path, clients, queries_per_client))
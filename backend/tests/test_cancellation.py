@@ -0,0 +1,98 @@
+import asyncio
+import os
+import shutil
+import time
+
+import pytest
+from pydantic import ValidationError
+
+from app.backends.stub import StubBackend
+from app.models import QueryRequest
+from app.nlp_service import NLPService
+from app.query_queue import QueryQueue, QueryStatus
+from app.session_manager import SessionManager
+from app.state_store import MemoryStateStore
+from app.worker import QueryWorker
+
+SAMPLE_DB = os.path.join(os.path.dirname(__file__), "..", "..", "database", "sample_ecommerce.db")
+
+
+async def wait_for_status(queue, query_id, statuses, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = queue.get_query_status(query_id).status
+        if status in statuses:
+            return status
+        await asyncio.sleep(0.05)
+    pytest.fail(f"query stayed {status.value}")
+
+
+def test_queued_query_is_cancelled_before_it_runs():
+    async def run():
+        queue = QueryQueue(MemoryStateStore())
+        query_id = await queue.add_query("session", "Show all orders")
+        assert queue.cancel_query(query_id) == QueryStatus.CANCELLED
+        assert queue._claim() is None
+        return queue.get_query_status(query_id)
+
+    query = asyncio.run(run())
+    assert query.status == QueryStatus.CANCELLED
+    assert query.error == "Query cancelled by user"
+
+
+def test_expired_deadline_is_dropped_at_claim():
+    async def run():
+        queue = QueryQueue(MemoryStateStore())
+        expired = await queue.add_query("session", "Show all orders", timeout=0.01)
+        await asyncio.sleep(0.05)
+        fresh = await queue.add_query("session", "Show all customers")
+        assert queue._claim() == fresh
+        return queue.get_query_status(expired)
+
+    query = asyncio.run(run())
+    assert query.status == QueryStatus.CANCELLED
+    assert "deadline" in query.error
+
+
+@pytest.mark.skipif(not os.path.exists(SAMPLE_DB), reason="sample database not available")
+def test_running_query_stops_through_its_token(tmp_path):
+    db_path = str(tmp_path / "sample.db")
+    shutil.copy(SAMPLE_DB, db_path)
+    store = MemoryStateStore()
+    queue = QueryQueue(store)
+    sessions = SessionManager(store=store)
+    backend = StubBackend(token_latency=0.2)
+    worker = QueryWorker(queue, sessions, NLPService(backend=backend), cancel_poll_interval=0.05)
+
+    async def run():
+        session_id = sessions.create_session()
+        assert sessions.get_session(session_id).connect_sqlite(db_path)
+        processor = asyncio.create_task(worker.run())
+        try:
+            query_id = await queue.add_query(session_id, "Show all orders")
+            await wait_for_status(queue, query_id, {QueryStatus.PROCESSING})
+            started = time.time()
+            assert queue.cancel_query(query_id) == QueryStatus.PROCESSING
+            await wait_for_status(queue, query_id, {QueryStatus.CANCELLED, QueryStatus.COMPLETED, QueryStatus.FAILED})
+            return queue.get_query_status(query_id), time.time() - started
+        finally:
+            processor.cancel()
+
+    query, elapsed = asyncio.run(run())
+    assert query.status == QueryStatus.CANCELLED
+    assert query.result is None
+    # Generation stops at the next token instead of running to completion
+    assert elapsed < 2
+
+
+@pytest.mark.parametrize("timeout", [0, -1])
+def test_non_positive_timeouts_are_rejected(timeout):
+    # FastAPI turns this validation error into a 422
+    with pytest.raises(ValidationError):
+        QueryRequest(query="Show all orders", session_id="session", timeout=timeout)
+
+    async def add():
+        await QueryQueue(MemoryStateStore()).add_query("session", "Show all orders", timeout=timeout)
+
+    with pytest.raises(ValueError):
+        asyncio.run(add())
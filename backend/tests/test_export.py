@@ -0,0 +1,50 @@
+import io
+from decimal import Decimal
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from app.export import scan_arrow_schema, stream_export
+
+COLUMNS = ["id", "price", "note"]
+ROWS = [(1, 20, "a"), (2, 30, None), (3, 19.99, "c"), (4, 5, 7)]
+
+
+def batches(rows=ROWS, size=2):
+    for start in range(0, len(rows), size):
+        yield COLUMNS, rows[start:start + size]
+
+
+def export(fmt, rows=ROWS):
+    schema = scan_arrow_schema(batches(rows))
+    return b"".join(stream_export(batches(rows), fmt, schema))
+
+
+@pytest.mark.parametrize("fmt", ["arrow", "parquet"])
+def test_int_then_float_column_round_trips_without_truncation(fmt):
+    data = export(fmt)
+    table = pa.ipc.open_stream(data).read_all() if fmt == "arrow" else pq.read_table(io.BytesIO(data))
+    assert table.column("id").type == pa.int64()
+    assert table.column("price").type == pa.float64()
+    assert table.column("price").to_pylist() == [20, 30, 19.99, 5]
+    # Text mixed with numbers is kept as text instead of failing mid-stream
+    assert table.column("note").to_pylist() == ["a", None, "c", "7"]
+
+
+def test_decimals_widen_to_fit_every_batch():
+    rows = [(1, Decimal("5"), "a"), (2, Decimal("19.99"), "b"), (3, Decimal("123456.125"), "c")]
+    table = pa.ipc.open_stream(export("arrow", rows)).read_all()
+    assert table.column("price").type == pa.decimal128(9, 3)
+    assert table.column("price").to_pylist() == [Decimal("5"), Decimal("19.99"), Decimal("123456.125")]
+
+
+def test_empty_result_keeps_column_names():
+    table = pa.ipc.open_stream(b"".join(stream_export([(COLUMNS, [])], "arrow", scan_arrow_schema([(COLUMNS, [])])))).read_all()
+    assert table.column_names == COLUMNS
+    assert table.num_rows == 0
+
+
+def test_csv_streams_without_a_schema():
+    assert b"".join(stream_export(batches(), "csv")).decode().splitlines() == [
+        "id,price,note", "1,20,a", "2,30,", "3,19.99,c", "4,5,7"]
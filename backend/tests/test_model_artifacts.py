@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app import model_artifacts
+from app.model_artifacts import ChecksumMismatch, ModelArtifactManager
+
+CHUNK = 64 * 1024
+BLOB = os.urandom(10 * CHUNK + 123)
+BLOB_SHA256 = hashlib.sha256(BLOB).hexdigest()
+
+
+class StandIn:
+    """Local HTTP server standing in for the model origin or a mirror"""
+
+    def __init__(self, ranges=True, redirect_to=None):
+        self.ranges = ranges
+        self.redirect_to = redirect_to
+        self.requests = []
+        self.authorization = []
+        self.truncate_once = set()
+        self.lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def redirect(self):
+                with stand_in.lock:
+                    stand_in.authorization.append(self.headers.get("Authorization"))
+                if not stand_in.redirect_to:
+                    return False
+                self.send_response(302)
+                self.send_header("Location", stand_in.redirect_to + self.path)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return True
+
+            def do_HEAD(self):
+                if self.redirect():
+                    return
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(BLOB)))
+                if stand_in.ranges:
+                    self.send_header("Accept-Ranges", "bytes")
+                self.end_headers()
+
+            def do_GET(self):
+                if self.redirect():
+                    return
+                range_header = self.headers.get("Range")
+                with stand_in.lock:
+                    stand_in.requests.append((self.path, range_header))
+                if range_header and stand_in.ranges:
+                    start, end = (int(x) for x in range_header.split("=")[1].split("-"))
+                    body = BLOB[start:end + 1]
+                    with stand_in.lock:
+                        if start in stand_in.truncate_once:
+                            stand_in.truncate_once.discard(start)
+                            body = body[:len(body) // 2]
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{start + len(body) - 1}/{len(BLOB)}")
+                else:
+                    body = BLOB
+                    self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def ranged_gets(self):
+        return [r for _, r in self.requests if r]
+
+
+@pytest.fixture
+def server():
+    stand_in = StandIn()
+    yield stand_in
+    stand_in.server.shutdown()
+
+
+def manager(tmp_path, **kwargs):
+    return ModelArtifactManager(str(tmp_path / "models"), workers=4, chunk_size=CHUNK, timeout=5,
+                                progress_interval=60, **kwargs)
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_parallel_ranged_download_and_cached_checksum(tmp_path, server, monkeypatch):
+    artifacts = manager(tmp_path)
+    path = artifacts.fetch("model.gguf", f"{server.url}/model.gguf", sha256=BLOB_SHA256)
+    assert read(path) == BLOB
+    assert len(server.ranged_gets()) == 11
+    assert not os.path.exists(path + ".part") and not os.path.exists(path + ".part.json")
+
+    # The digest recorded after download is reused instead of hashing the file again
+    monkeypatch.setattr(model_artifacts, "sha256_file", lambda p: pytest.fail("file was re-hashed"))
+    server.requests.clear()
+    assert artifacts.fetch("model.gguf", f"{server.url}/model.gguf", sha256=BLOB_SHA256) == path
+    assert server.requests == []
+
+
+def test_truncated_chunk_is_retried(tmp_path, server, monkeypatch):
+    monkeypatch.setattr(model_artifacts.time, "sleep", lambda s: None)
+    server.truncate_once = {3 * CHUNK}
+    path = manager(tmp_path).fetch("model.gguf", f"{server.url}/model.gguf", sha256=BLOB_SHA256)
+    assert read(path) == BLOB
+    assert server.ranged_gets().count(f"bytes={3 * CHUNK}-{4 * CHUNK - 1}") == 2
+
+
+def test_resume_fetches_only_missing_chunks(tmp_path, server):
+    cache = tmp_path / "models"
+    cache.mkdir()
+    part = cache / "model.gguf.part"
+    done = [0, 1, 2, 5]
+    data = bytearray(len(BLOB))
+    for index in done:
+        data[index * CHUNK:(index + 1) * CHUNK] = BLOB[index * CHUNK:(index + 1) * CHUNK]
+    part.write_bytes(bytes(data))
+    (cache / "model.gguf.part.json").write_text(json.dumps({"size": len(BLOB), "chunk_size": CHUNK, "done": done}))
+
+    path = manager(tmp_path).fetch("model.gguf", f"{server.url}/model.gguf", sha256=BLOB_SHA256)
+    assert read(path) == BLOB
+    starts = sorted(int(r.split("=")[1].split("-")[0]) // CHUNK for r in server.ranged_gets())
+    assert starts == [i for i in range(11) if i not in done]
+
+
+def test_local_mirror_directory_is_used_without_network(tmp_path, server):
+    mirror = tmp_path / "mirror"
+    mirror.mkdir()
+    (mirror / "model.gguf").write_bytes(BLOB)
+    path = manager(tmp_path, mirror=str(mirror)).fetch("model.gguf", f"{server.url}/model.gguf", sha256=BLOB_SHA256)
+    assert path == str(mirror / "model.gguf")
+    assert server.requests == []
+
+
+def test_mirror_url_replaces_origin(tmp_path, server):
+    path = manager(tmp_path, mirror=f"{server.url}/mirror").fetch("model.gguf", "http://127.0.0.1:9/origin/model.gguf",
+                                                                  sha256=BLOB_SHA256)
+    assert read(path) == BLOB
+    assert {p for p, _ in server.requests} == {"/mirror/model.gguf"}
+
+
+def test_checksum_mismatch_discards_download(tmp_path, server):
+    artifacts = manager(tmp_path)
+    with pytest.raises(ChecksumMismatch):
+        artifacts.fetch("model.gguf", f"{server.url}/model.gguf", sha256="0" * 64)
+    assert os.listdir(tmp_path / "models") == []
+
+
+def test_corrupt_cached_file_is_downloaded_again(tmp_path, server):
+    cache = tmp_path / "models"
+    cache.mkdir()
+    (cache / "model.gguf").write_bytes(b"corrupt")
+    path = manager(tmp_path).fetch("model.gguf", f"{server.url}/model.gguf", sha256=BLOB_SHA256)
+    assert read(path) == BLOB
+
+
+def test_servers_without_range_support_use_a_single_stream(tmp_path):
+    server = StandIn(ranges=False)
+    try:
+        path = manager(tmp_path).fetch("model.gguf", f"{server.url}/model.gguf", sha256=BLOB_SHA256)
+        assert read(path) == BLOB
+        assert server.requests == [("/model.gguf", None)]
+    finally:
+        server.server.shutdown()
+
+
+def test_token_is_only_sent_to_token_hosts(tmp_path, server):
+    origin = StandIn(redirect_to=server.url)
+    try:
+        origin_host = origin.url.split("://")[1]
+        artifacts = manager(tmp_path, token="secret", token_hosts=(origin_host,))
+        path = artifacts.fetch("model.gguf", f"{origin.url}/model.gguf", sha256=BLOB_SHA256)
+        assert read(path) == BLOB
+        assert origin.authorization == ["Bearer secret"]
+        # The CDN the origin redirects to never sees the token
+        assert server.authorization and set(server.authorization) == {None}
+    finally:
+        origin.server.shutdown()
+
+
+def test_token_is_not_sent_to_mirror_urls(tmp_path, server):
+    artifacts = manager(tmp_path, token="secret", mirror=f"{server.url}/mirror")
+    artifacts.fetch("model.gguf", "https://huggingface.co/org/repo/resolve/main/model.gguf", sha256=BLOB_SHA256)
+    assert server.authorization and set(server.authorization) == {None}
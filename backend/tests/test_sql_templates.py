@@ -0,0 +1,60 @@
+from app.sql_templates import SQLTemplateCache, build_template, extract_literals
+
+
+def learn_and_lookup(question, sql, new_question, known_values=None):
+    cache = SQLTemplateCache()
+    learned = cache.learn("fp", question, sql, known_values)
+    return learned, cache.lookup("fp", new_question, known_values)
+
+
+def test_rebinds_literals_that_appear_once():
+    learned, sql = learn_and_lookup(
+        "top 10 products in 2023",
+        "SELECT name FROM products WHERE strftime('%Y', created_at) = '2023' ORDER BY sales DESC LIMIT 10",
+        "top 25 products in 2024",
+    )
+    assert learned
+    assert sql == "SELECT name FROM products WHERE strftime('%Y', created_at) = '2024' ORDER BY sales DESC LIMIT 25"
+
+
+def test_rebinds_known_values_and_escapes_quotes():
+    learned, sql = learn_and_lookup(
+        "orders that are shipped", "SELECT * FROM orders WHERE status = 'shipped'",
+        "orders that are o'brien", known_values=["shipped", "o'brien"],
+    )
+    assert learned
+    assert sql == "SELECT * FROM orders WHERE status = 'o''brien'"
+
+
+def test_rejects_year_next_to_derived_date_bounds():
+    learned, sql = learn_and_lookup(
+        "orders in 2023",
+        "SELECT * FROM orders WHERE order_date >= '2023-01-01' AND order_date < '2024-01-01'",
+        "orders in 2020",
+    )
+    assert not learned
+    assert sql is None
+
+
+def test_rejects_literal_that_also_appears_as_group_by_ordinal():
+    shape, literals = extract_literals("customers with more than 1 order")
+    sql = "SELECT customer_id FROM orders GROUP BY 1 HAVING COUNT(*) > 1"
+    assert build_template(shape, literals, sql) is None
+
+
+def test_rejects_literal_that_also_appears_as_limit():
+    shape, literals = extract_literals("orders above 100")
+    assert build_template(shape, literals, "SELECT * FROM orders WHERE total > 100 LIMIT 100") is None
+
+
+def test_rejects_literal_missing_from_sql():
+    shape, literals = extract_literals("orders above 100")
+    assert build_template(shape, literals, "SELECT * FROM orders WHERE total > 99") is None
+
+
+def test_year_sized_number_without_other_years_is_rebound():
+    learned, sql = learn_and_lookup(
+        "orders over 2000", "SELECT * FROM orders WHERE total_amount > 2000", "orders over 1500",
+    )
+    assert learned
+    assert sql == "SELECT * FROM orders WHERE total_amount > 1500"
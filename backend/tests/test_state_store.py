@@ -0,0 +1,152 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+
+import pytest
+
+from app.query_queue import QueryQueue
+from app.state_store import CANCELLED, PROCESSING, QUEUED, MemoryStateStore, SQLiteStateStore
+
+
+def make_store(kind, tmp_path):
+    if kind == "memory":
+        return MemoryStateStore(), None
+    if kind == "sqlite":
+        return SQLiteStateStore(str(tmp_path / "state.db")), None
+    pytest.importorskip("redis")
+    from app.state_store import RedisStateStore
+    store = RedisStateStore(os.getenv("TEST_REDIS_URL", "redis://localhost:6379/15"), prefix=f"test-{uuid.uuid4().hex}")
+    try:
+        store.redis.ping()
+    except Exception as e:
+        pytest.skip(f"Redis not reachable: {e}")
+
+    def cleanup():
+        keys = list(store.redis.scan_iter(f"{store.prefix}:*"))
+        if keys:
+            store.redis.delete(*keys)
+    return store, cleanup
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def store(request, tmp_path):
+    store, cleanup = make_store(request.param, tmp_path)
+    yield store
+    if cleanup:
+        cleanup()
+
+
+def job(job_id, created_at=None):
+    return {"id": job_id, "status": QUEUED, "created_at": created_at or time.time()}
+
+
+def add_jobs(store, count):
+    now = time.time()
+    ids = [f"job-{i}" for i in range(count)]
+    for i, job_id in enumerate(ids):
+        store.save_job(job(job_id, now + i * 0.001))
+    return ids
+
+
+def test_claims_oldest_first_and_stamps_fields(store):
+    ids = add_jobs(store, 3)
+    assert store.claim_next_job({"worker_id": "w1"}) == ids[0]
+    claimed = store.load_job(ids[0])
+    assert claimed["status"] == PROCESSING and claimed["worker_id"] == "w1" and claimed["started_at"]
+    assert store.claim_next_job() == ids[1]
+    assert store.claim_next_job() == ids[2]
+    assert store.claim_next_job() is None
+    assert store.job_counts()[PROCESSING] == 3
+
+
+def test_each_job_is_claimed_exactly_once(store):
+    ids = add_jobs(store, 40)
+    claimed, lock = [], threading.Lock()
+
+    def claim():
+        while True:
+            job_id = store.claim_next_job()
+            if job_id is None:
+                return
+            with lock:
+                claimed.append(job_id)
+
+    threads = [threading.Thread(target=claim) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed) == sorted(ids)
+
+
+def test_expected_status_guards_updates(store):
+    (job_id,) = add_jobs(store, 1)
+    assert store.claim_next_job() == job_id
+    # A cancel racing the claim sees the job already processing
+    assert not store.update_job(job_id, {"status": CANCELLED}, expected_status=QUEUED)
+    assert store.load_job(job_id)["status"] == PROCESSING
+    assert store.update_job(job_id, {"cancel_requested": True}, expected_status=PROCESSING)
+    assert store.load_job(job_id)["cancel_requested"] is True
+    assert not store.update_job("missing", {"status": CANCELLED})
+
+
+def test_concurrent_compare_and_set_has_one_winner(store):
+    (job_id,) = add_jobs(store, 1)
+    results, lock = [], threading.Lock()
+
+    def cancel(worker):
+        updated = store.update_job(job_id, {"status": CANCELLED, "by": worker}, expected_status=QUEUED)
+        with lock:
+            results.append(updated)
+
+    threads = [threading.Thread(target=cancel, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(True) == 1
+    assert store.load_job(job_id)["status"] == CANCELLED
+
+
+def test_claim_skips_jobs_cancelled_while_queued(store):
+    ids = add_jobs(store, 2)
+    assert store.update_job(ids[0], {"status": CANCELLED}, expected_status=QUEUED)
+    assert store.claim_next_job() == ids[1]
+    assert store.claim_next_job() is None
+
+
+def test_requeued_job_is_claimed_next(store):
+    ids = add_jobs(store, 2)
+    assert store.claim_next_job() == ids[0]
+    assert store.requeue_job(ids[0], {"retries": 1})
+    assert not store.requeue_job(ids[0])
+    assert sorted(j["id"] for j in store.list_jobs(QUEUED)) == ids
+    assert store.claim_next_job() == ids[0]
+    assert store.load_job(ids[0])["retries"] == 1
+    assert [j["id"] for j in store.list_jobs(PROCESSING)] == [ids[0]]
+
+
+def test_old_jobs_are_deleted_with_their_payloads(store):
+    store.save_job(job("old", time.time() - 100))
+    store.save_job(job("new"))
+    store.save_payload("old", "json", b"{}")
+    store.save_payload("new", "json", b"[]")
+    store.delete_jobs_before(time.time() - 50)
+    assert store.load_job("old") is None and store.load_payload("old", "json") is None
+    assert store.load_payload("new", "json") == b"[]"
+    assert store.claim_next_job() == "new"
+
+
+def test_jobs_of_a_dead_worker_are_requeued_then_failed(store):
+    queue = QueryQueue(store, lease_seconds=0.05, max_retries=1)
+    query_id = asyncio.run(queue.add_query("session", "question"))
+    assert queue._claim() == query_id
+    time.sleep(0.1)
+    assert queue.recover_stale_jobs() == 1
+    assert store.load_job(query_id)["status"] == QUEUED
+    assert queue._claim() == query_id
+    time.sleep(0.1)
+    assert queue.recover_stale_jobs() == 1
+    assert store.load_job(query_id)["status"] == "failed"
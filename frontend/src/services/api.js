@@ -98,6 +98,15 @@ export const getQueryStatus = async (queryId) => {
   }
 };
 
+export const cancelQuery = async (queryId) => {
+  try {
+    const response = await api.delete(`/api/query/${queryId}`);
+    return response.data;
+  } catch (error) {
+    throw new Error(error.response?.data?.detail || 'Failed to cancel query');
+  }
+};
+
 export const executeQuery = async (query, sessionId, onStatsUpdate = null) => {
   // Submit query and poll for result
   const submission = await submitQuery(query, sessionId);
@@ -124,6 +133,9 @@ export const executeQuery = async (query, sessionId, onStatsUpdate = null) => {
         } else if (status.status === 'failed') {
           reject(new Error(status.error || 'Query failed'));
           return;
+        } else if (status.status === 'cancelled') {
+          reject(new Error(status.error || 'Query cancelled'));
+          return;
         }
         
         // Schedule next poll with adaptive interval
@@ -147,9 +159,10 @@ export const executeQuery = async (query, sessionId, onStatsUpdate = null) => {
     // Start polling
     poll();
     
-    // Timeout after 5 minutes
+    // Timeout after 5 minutes; stop the server-side work too so it does not run for nobody
     setTimeout(() => {
       clearTimeout(pollTimeout);
+      cancelQuery(submission.query_id).catch(() => {});
       reject(new Error('Query timeout'));
     }, 300000);
   });